@@ -47,6 +47,11 @@ _project_root = Path(__file__).resolve().parents[2]
 _default_sqlite_path = (_project_root / "app.db").as_posix()
 _default_database_url = f"sqlite:///{_default_sqlite_path}"
 DATABASE_URL = os.getenv("DATABASE_URL", _default_database_url)
+# Connection pool; chat requests hold extra sessions in worker threads alongside the request's own
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # Seconds before a connection is replaced
 
 # =============================================================================
 # LLM Provider Configuration
@@ -75,9 +80,29 @@ CHUNK_OVERLAP = 128  # Overlap between consecutive chunks
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "doctalk_chunks")
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "scalar").lower()  # 'scalar' (INT8), 'product', 'binary' or 'none'
+QDRANT_PQ_COMPRESSION = os.getenv("QDRANT_PQ_COMPRESSION", "x16").lower()  # x4, x8, x16, x32 or x64 (product only)
 
 # =============================================================================
 # Embedding Model Configuration
 # =============================================================================
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "custom")
 EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none").lower()  # 'int8' (dynamic, CPU) or 'none'; re-index after changing
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))  # How long concurrent queries wait to share an encode
+EMBEDDING_BATCH_MAX = int(os.getenv("EMBEDDING_BATCH_MAX", "32"))  # Most texts encoded together per batch
+
+# =============================================================================
+# Reranker Configuration
+# =============================================================================
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")  # Cross-encoder; empty disables reranking
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))  # Dense hits scored by the reranker
+MMR_DIVERSITY = float(os.getenv("MMR_DIVERSITY", "0.3"))  # Weight against chunks similar to ones already picked; 0 disables
+MMR_SOURCE_PENALTY = float(os.getenv("MMR_SOURCE_PENALTY", "0.05"))  # Weight against repeating a document already picked
+
+# =============================================================================
+# Semantic Answer Cache
+# =============================================================================
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # Cosine similarity for a hit
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "1800"))  # Seconds a cached answer stays valid
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "64"))  # Per conversation
@@ -1,10 +1,20 @@
-from sqlalchemy import create_engine, inspect, text
+import json
+
+from sqlalchemy import create_engine, inspect, make_url, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-from .config import DATABASE_URL
+from .config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
 
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+# In-memory SQLite keeps one connection per thread and takes no queue settings
+pool_args = {} if make_url(DATABASE_URL).database in (None, "", ":memory:") else {
+	"pool_size": DB_POOL_SIZE,
+	"max_overflow": DB_MAX_OVERFLOW,
+	"pool_timeout": DB_POOL_TIMEOUT,
+	"pool_recycle": DB_POOL_RECYCLE,
+	"pool_pre_ping": True,
+}
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **pool_args)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -72,6 +82,8 @@ def run_migrations():
 			convo_statements.append("ALTER TABLE conversations ADD COLUMN llm_mode VARCHAR DEFAULT 'api'")
 		if "embedding_model" not in existing_convo_columns:
 			convo_statements.append("ALTER TABLE conversations ADD COLUMN embedding_model VARCHAR DEFAULT 'custom'")
+		if "version" not in existing_convo_columns:
+			convo_statements.append("ALTER TABLE conversations ADD COLUMN version INTEGER DEFAULT 0")
 
 		with engine.begin() as conn:
 			for stmt in convo_statements:
@@ -80,6 +92,57 @@ def run_migrations():
 				conn.execute(text("UPDATE conversations SET llm_mode = 'api' WHERE llm_mode IS NULL"))
 			if "embedding_model" not in existing_convo_columns:
 				conn.execute(text("UPDATE conversations SET embedding_model = 'custom' WHERE embedding_model IS NULL"))
+			if "version" not in existing_convo_columns:
+				conn.execute(text("UPDATE conversations SET version = 0 WHERE version IS NULL"))
+
+	# sources_json used to hold "||"-joined names; it is now a JSON array. The rows are
+	# converted once, and schema_migrations records that so later startups skip the scan
+	if "chat_messages" in tables:
+		with engine.begin() as conn:
+			conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR PRIMARY KEY)"))
+			converted = conn.execute(
+				text("SELECT 1 FROM schema_migrations WHERE name = 'sources_json_array'")
+			).first()
+			if not converted:
+				legacy_rows = []
+				for row in conn.execute(
+					text("SELECT id, sources_json FROM chat_messages WHERE sources_json IS NOT NULL")
+				):
+					# A name can itself start with "[", so parse rather than peek at the first character
+					try:
+						if isinstance(json.loads(row.sources_json), list):
+							continue
+					except ValueError:
+						pass
+					legacy_rows.append(row)
+				if legacy_rows:
+					conn.execute(
+						text("UPDATE chat_messages SET sources_json = :sources WHERE id = :id"),
+						[
+							{"id": row.id, "sources": json.dumps(row.sources_json.split("||")) if row.sources_json else None}
+							for row in legacy_rows
+						],
+					)
+				conn.execute(text("INSERT INTO schema_migrations (name) VALUES ('sources_json_array')"))
+
+	# Composite indexes for the hot chat filters. create_all only adds indexes
+	# together with new tables, so existing databases get them here
+	index_statements = [
+		("chat_messages", "CREATE INDEX IF NOT EXISTS ix_chat_messages_conversation_created "
+			"ON chat_messages (conversation_id, created_at)"),
+		("chat_messages", "CREATE INDEX IF NOT EXISTS ix_chat_messages_conversation_reply_version "
+			"ON chat_messages (conversation_id, reply_to_message_id, version_index, created_at)"),
+		("document_chunks", "CREATE INDEX IF NOT EXISTS ix_document_chunks_conversation_document "
+			"ON document_chunks (conversation_id, document_id, chunk_index)"),
+		("documents", "CREATE INDEX IF NOT EXISTS ix_documents_conversation_active "
+			"ON documents (conversation_id, is_active)"),
+		("flashcards", "CREATE INDEX IF NOT EXISTS ix_flashcards_conversation_order "
+			"ON flashcards (conversation_id, order_index)"),
+	]
+	with engine.begin() as conn:
+		for table, stmt in index_statements:
+			if table in tables:
+				conn.execute(text(stmt))
 
 	# Backfill: fix broken chaining where follow-up user messages were saved without reply_to_message_id.
 	# This is conservative: it only touches non-edited, version_index=1 user messages.
@@ -3,7 +3,7 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
 from .database import SessionLocal
-from .models.db_models import User
+from .models.db_models import Conversation, User
 from .utils.security import decode_access_token
 
 auth_scheme = HTTPBearer(auto_error=False)
@@ -34,3 +34,23 @@ def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     return user
+
+def get_owned_conversation(
+    conversation_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """The path's conversation if the current user owns it, else 404.
+
+    Only the columns routes read are selected, and FastAPI caches the result for the request.
+    """
+    conversation = (
+        db.query(Conversation.id, Conversation.llm_mode)
+        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
+        .first()
+    )
+
+    if not conversation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+
+    return conversation
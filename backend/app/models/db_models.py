@@ -1,8 +1,30 @@
+import json
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from ..database import Base
 
+class JSONText(TypeDecorator):
+    """JSON stored in a TEXT column, so existing tables need no column type change.
+
+    A value that isn't JSON is read as a legacy "||"-joined list.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value.split("||")
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -24,6 +46,7 @@ class Conversation(Base):
     embedding_model = Column(String, default="custom")  # 'custom' (DocTalk) or 'allminilm' (all-MiniLM-L6-v2)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, default=0)  # Bumped when documents, notes or messages change; feeds the ETag
 
     user = relationship("User", back_populates="conversations")
     documents = relationship("Document", back_populates="conversation", cascade="all, delete-orphan")
@@ -31,7 +54,7 @@ class Conversation(Base):
         "ChatMessage",
         back_populates="conversation",
         cascade="all, delete-orphan",
-        order_by="ChatMessage.created_at"
+        order_by="(ChatMessage.created_at, ChatMessage.id)"
     )
     chunks = relationship("DocumentChunk", back_populates="conversation", cascade="all, delete-orphan")
     flashcards = relationship("Flashcard", back_populates="conversation", cascade="all, delete-orphan")
@@ -39,6 +62,10 @@ class Conversation(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Active-document lookups per conversation
+        Index("ix_documents_conversation_active", "conversation_id", "is_active"),
+    )
 
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
@@ -53,6 +80,10 @@ class Document(Base):
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        # Chunks of a conversation's active documents, already in document order
+        Index("ix_document_chunks_conversation_document", "conversation_id", "document_id", "chunk_index"),
+    )
 
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
@@ -67,12 +98,21 @@ class DocumentChunk(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # A conversation's messages in creation order, without a sort step
+        Index("ix_chat_messages_conversation_created", "conversation_id", "created_at"),
+        # Replies grouped by parent in variant order, for the row_number() in get_conversation
+        Index(
+            "ix_chat_messages_conversation_reply_version",
+            "conversation_id", "reply_to_message_id", "version_index", "created_at",
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
     role = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    sources_json = Column(Text, nullable=True)
+    sources_json = Column(JSONText, nullable=True)  # List of source names
     source_chunks_json = Column(Text, nullable=True)
     prompt_snapshot = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -88,6 +128,10 @@ class ChatMessage(Base):
 
 class Flashcard(Base):
     __tablename__ = "flashcards"
+    __table_args__ = (
+        # A conversation's cards in order, and the next order_index, from one index
+        Index("ix_flashcards_conversation_order", "conversation_id", "order_index"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
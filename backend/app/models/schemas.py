@@ -42,6 +42,7 @@ class ChatRequest(BaseModel):
     is_edit: bool = False  # Indicates this is an edited message
     cloud_model: Optional[str] = None  # 'gemini' (default) or 'groq' when in cloud mode
     parent_message_id: Optional[int] = None  # Explicit parent for branching - message to chain from
+    fake_stream: bool = False  # Replay non-streaming replies word by word instead of one frame
 
 class ResponseVariant(BaseModel):
     id: int
@@ -111,6 +112,21 @@ class DocumentResponse(BaseModel):
     is_active: Optional[bool] = True
     has_embeddings: Optional[bool] = False
 
+class NoteResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    filename: str
+    content: Optional[str] = None
+    doc_type: Optional[str] = 'note'
+    is_active: Optional[bool] = True
+    uploaded_at: Optional[datetime] = None
+    # Set only by the convert/unconvert endpoints
+    message: Optional[str] = None
+    has_embeddings: Optional[bool] = None
+    chunks_created: Optional[int] = None
+    chunks_deleted: Optional[int] = None
+
 class ConversationDetailResponse(BaseModel):
     conversation: ConversationSummary
     messages: List[ChatMessageResponse]
@@ -9,7 +9,7 @@ from ..models.schemas import UploadResponse
 
 logger = logging.getLogger(__name__)
 from ..utils.document_processor import DocumentProcessor
-from ..utils.embeddings import EmbeddingProcessor, QdrantVectorStore
+from ..utils.embeddings import EmbeddingProcessor, QdrantVectorStore, invalidate_hybrid_rag_processor
 from ..config import MAX_FILE_SIZE
 from ..dependencies import get_db, get_current_user
 from ..models.db_models import Conversation, Document, DocumentChunk
@@ -172,6 +172,7 @@ async def add_documents_to_conversation(
             # Update conversation timestamp
             conversation.updated_at = datetime.utcnow()
             db.commit()
+            invalidate_hybrid_rag_processor(conversation.id)
 
             return UploadResponse(
                 message=f"Added {len(processed_files)} document(s) to conversation",
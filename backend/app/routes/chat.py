@@ -1,20 +1,89 @@
+import asyncio
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Response
 from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, literal, select, update
 from sqlalchemy.orm import Session
 import json
+from json.encoder import encode_basestring_ascii
 
-from ..models.schemas import ChatRequest, ChatResponse, ChatMessageResponse, ResponseVariant
-from ..utils.embeddings import HybridRAGProcessor
-from ..utils.llm_router import get_llm_client
-from ..utils.ollama_client import LLMRequestContext, LocalModeLock, acquire_llm_lock, release_llm_lock
+from ..models.schemas import ChatRequest, ChatResponse, ChatMessageResponse, ResponseVariant, SourceWithChunk
+from ..utils.embeddings import FALLBACK_CHUNK_LIMIT, ChunkColumns, HybridRAGProcessor, get_hybrid_rag_processor
+from ..utils.llm_router import get_llm_client, is_summary_request
+from ..utils.ollama_client import (
+    LLMRequestContext,
+    LocalModeLock,
+    TRAILING_ARTIFACT_RE,
+    acquire_llm_lock,
+    release_llm_lock,
+)
 from ..utils.hierarchical_processor import hierarchical_summarization
 from ..dependencies import get_db, get_current_user
 from ..models.db_models import Conversation, DocumentChunk, ChatMessage, Document
 from ..database import SessionLocal
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# SSE token frame as bytes; matches json.dumps({'type': 'token', 'content': token}) byte-for-byte
+_TOKEN_PREFIX = b'data: {"type": "token", "content": '
+_TOKEN_SUFFIX = b'}\n\n'
+
+# SSE done frame; same layout json.dumps produces for the done dict
+_DONE_FRAME = 'data: {"type": "done", "assistant_message_id": %d, "full_response": %s%s}\n\n'
+
+# SSE error frame; same layout json.dumps produces for the error dict
+_ERROR_FRAME = 'data: {"type": "error", "message": %s}\n\n'
+
+
+# SSE meta frame; same layout json.dumps produces for the meta dict
+_META_FRAME = (
+    'data: {"type": "meta", "sources": %s, "source_chunks": %s, '
+    '"user_message_id": %s, "edit_group_id": %s}\n\n'
+)
+
+
+def _token_frame(token: str) -> bytes:
+    # ASCII-escaped JSON, so the ascii codec is exact and cheaper than utf-8
+    return _TOKEN_PREFIX + encode_basestring_ascii(token).encode("ascii") + _TOKEN_SUFFIX
+
+
+def _meta_frame(
+    sources: list[str],
+    source_chunks_json: str | None,
+    user_message_id: int | None,
+    edit_group_id: int | None,
+) -> bytes:
+    # Splices in the already-encoded source chunks; every part is ASCII-escaped JSON
+    return (
+        _META_FRAME % (
+            json.dumps(sources),
+            source_chunks_json or "[]",
+            json.dumps(user_message_id),
+            json.dumps(edit_group_id),
+        )
+    ).encode("ascii")
+
+
+def _error_frame(message: str) -> bytes:
+    return (_ERROR_FRAME % encode_basestring_ascii(message)).encode("ascii")
+
+
+# Fixed error frames, encoded once
+_BUSY_FRAME = _error_frame('Another request is in progress. Please wait and try again.')
+_OLLAMA_BUSY_FRAME = _error_frame('Ollama is busy with another request. Please wait.')
+
+
+def _done_frame(assistant_message_id: int, full_response: str, error: bool) -> bytes:
+    return (
+        _DONE_FRAME % (assistant_message_id, encode_basestring_ascii(full_response), ', "error": true' if error else '')
+    ).encode("ascii")
+
 
 def _get_latest_assistant_id(db: Session, conversation_id: int) -> int | None:
     last_assistant = (
@@ -29,6 +98,154 @@ def _get_latest_assistant_id(db: Session, conversation_id: int) -> int | None:
     return last_assistant.id if last_assistant else None
 
 
+def _has_any_assistant(db: Session, conversation_id: int) -> bool:
+    return db.query(
+        db.query(ChatMessage.id)
+        .filter(ChatMessage.conversation_id == conversation_id, ChatMessage.role == "assistant")
+        .exists()
+    ).scalar()
+
+
+def _next_version_index(db: Session, conversation_id: int, edit_group_id: int) -> int:
+    max_version = (
+        db.query(func.coalesce(func.max(ChatMessage.version_index), 0))
+        .filter(
+            ChatMessage.conversation_id == conversation_id,
+            ChatMessage.edit_group_id == edit_group_id,
+            ChatMessage.role == "user",
+        )
+        .scalar()
+    )
+    return max_version + 1
+
+
+def _insert_message(db: Session, **values) -> tuple[int, datetime]:
+    """Insert a chat message and return its (id, created_at) in the same round-trip."""
+    row = db.execute(
+        insert(ChatMessage).returning(ChatMessage.id, ChatMessage.created_at),
+        values,
+    ).one()
+    return row.id, row.created_at
+
+
+def _save_stream_messages(rows: list[dict], touch_conversation_id: int | None = None) -> list[int]:
+    """Write messages produced after a stream in one executemany INSERT and one commit.
+
+    Runs in its own session because the request session is closed by the time
+    the stream finishes. Returns the new ids in the order of ``rows``.
+    """
+    session = SessionLocal()
+    try:
+        ids = session.execute(
+            insert(ChatMessage).returning(ChatMessage.id, sort_by_parameter_order=True),
+            rows,
+        ).scalars().all()
+        if touch_conversation_id is not None:
+            session.execute(
+                update(Conversation)
+                .where(Conversation.id == touch_conversation_id)
+                .values(updated_at=datetime.utcnow())
+            )
+        session.commit()
+        return ids
+    finally:
+        session.close()
+
+
+def _save_chat_turn(
+    db: Session,
+    user_values: dict,
+    assistant_values: dict,
+) -> tuple[int, datetime, int, datetime]:
+    """Insert a user message and its assistant reply in one transaction.
+
+    INSERT ... RETURNING hands back id/created_at directly, so no refresh round-trips.
+    Returns (user_id, user_created_at, assistant_id, assistant_created_at).
+    """
+    user_id, user_created_at = _insert_message(db, **user_values)
+
+    # For new messages, set edit_group_id to its own ID
+    if user_values.get("edit_group_id") is None:
+        db.execute(
+            update(ChatMessage)
+            .where(ChatMessage.id == user_id)
+            .values(edit_group_id=user_id)
+        )
+
+    assistant_id, assistant_created_at = _insert_message(
+        db, **assistant_values, reply_to_message_id=user_id
+    )
+    db.commit()
+    return user_id, user_created_at, assistant_id, assistant_created_at
+
+
+def _touch_conversation(conversation_id: int) -> None:
+    """Bump a conversation's updated_at in its own session (run after the response is sent)."""
+    session = SessionLocal()
+    try:
+        session.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(updated_at=datetime.utcnow())
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def _save_user_message(values: dict) -> tuple[int, int]:
+    """Insert a new user message in its own session; returns (id, edit_group_id).
+
+    New messages start their own edit group, keyed by their own id.
+    """
+    session = SessionLocal()
+    try:
+        message_id, _ = _insert_message(session, **values)
+        edit_group_id = values.get("edit_group_id")
+        if edit_group_id is None:
+            edit_group_id = message_id
+            session.execute(
+                update(ChatMessage)
+                .where(ChatMessage.id == message_id)
+                .values(edit_group_id=message_id)
+            )
+        session.commit()
+        return message_id, edit_group_id
+    finally:
+        session.close()
+
+
+async def _abandon_lock_task(lock_task: asyncio.Task, conversation_id: int) -> None:
+    """Cancel a pending LLM lock acquisition, or release the lock if it already went through.
+
+    A cancelled acquisition is waited for, since it may win the lock before the
+    cancellation lands.
+    """
+    if not lock_task.done():
+        lock_task.cancel()
+        await asyncio.wait([lock_task])
+    if not lock_task.cancelled() and lock_task.exception() is None and lock_task.result():
+        await release_llm_lock(conversation_id)
+
+
+class _CleanupStreamingResponse(StreamingResponse):
+    """StreamingResponse that awaits ``cleanup`` once it is done, even if the body never started.
+
+    Starlette skips a response's background task when the client disconnects, and
+    a body iterator that was never started never runs its own ``finally``.
+    """
+
+    def __init__(self, content, cleanup: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self._cleanup = cleanup
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._cleanup()
+
+
 def _validate_parent_message_id(
     db: Session,
     conversation_id: int,
@@ -49,6 +266,80 @@ def _validate_parent_message_id(
     return parent.id
 
 
+def _collect_summary_chunks(chunks: list, filenames: dict[int, str]) -> list[dict]:
+    """Tag already-ordered (document_id, content) rows with their source, dropping repeated text.
+
+    The same text can appear more than once (e.g. a file uploaded twice); only its first
+    occurrence is kept so duplicates don't take up summary slots.
+    """
+    first_document = {}
+    for chunk in chunks:
+        first_document.setdefault(chunk.content, chunk.document_id)
+    return [
+        {"content": content, "metadata": {"source": filenames.get(document_id, "Unknown")}}
+        for content, document_id in first_document.items()
+    ]
+
+
+def _cached_regenerate_chunks(
+    db: Session,
+    prepared: "ChatPrepared",
+    user_message_id: int,
+    message: str,
+) -> list[dict] | None:
+    """Reuse the document chunks retrieved for an earlier answer to the same prompt.
+
+    Returns None (run retrieval again) when the prompt differs, when chunks were
+    added or re-created after that answer, or when one of its sources is no
+    longer active.
+    """
+    previous = (
+        db.query(ChatMessage.prompt_snapshot, ChatMessage.source_chunks_json, ChatMessage.created_at)
+        .filter(
+            ChatMessage.conversation_id == prepared.conversation.id,
+            ChatMessage.role == "assistant",
+            ChatMessage.reply_to_message_id == user_message_id,
+            ChatMessage.source_chunks_json.isnot(None),
+        )
+        .order_by(ChatMessage.id.desc())
+        .first()
+    )
+    if previous is None or previous.prompt_snapshot != message:
+        return None
+
+    newest_chunk_at = prepared.newest_chunk_at
+    if newest_chunk_at and previous.created_at and newest_chunk_at > previous.created_at:
+        return None
+
+    try:
+        source_chunks = json.loads(previous.source_chunks_json)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+    # Page-level sources look like "file.pdf_page_3"; match them to their document
+    active_names = set(prepared.active_doc_names)
+    document_chunks = []
+    for sc in source_chunks:
+        source = sc.get("source", "Unknown")
+        if source not in active_names and source.split("_page_")[0] not in active_names:
+            return None
+        document_chunks.append({
+            "content": sc.get("chunk", ""),
+            "metadata": {"source": source, "type": "document"},
+            "score": 1.0,
+        })
+    return document_chunks or None
+
+
+def _rag_signature(active_doc_ids: list[int], chunk_count: int, max_chunk_id: int | None) -> tuple:
+    """Identify the document state a cached RAG processor was built from.
+
+    Re-chunking (e.g. re-converting a note) allocates new chunk ids, so the
+    highest id changes even when the chunk count does not.
+    """
+    return (tuple(active_doc_ids), chunk_count, max_chunk_id or 0)
+
+
 def _build_branch_chat_history(
     db: Session,
     conversation_id: int,
@@ -62,30 +353,61 @@ def _build_branch_chat_history(
     if tail_assistant_id is None:
         return []
 
-    history_msgs: list[ChatMessage] = []
-    current_id: int | None = tail_assistant_id
-    visited: set[int] = set()
+    # Recursive CTE follows reply pointers server-side; depth bound also stops cycles
+    chain = (
+        select(
+            ChatMessage.id,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.reply_to_message_id,
+            literal(1).label("depth"),
+        )
+        .where(
+            ChatMessage.id == tail_assistant_id,
+            ChatMessage.conversation_id == conversation_id,
+        )
+        .cte("chain", recursive=True)
+    )
+    chain = chain.union_all(
+        select(
+            ChatMessage.id,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.reply_to_message_id,
+            chain.c.depth + 1,
+        )
+        .join(chain, ChatMessage.id == chain.c.reply_to_message_id)
+        .where(
+            ChatMessage.conversation_id == conversation_id,
+            chain.c.depth < max_messages,
+        )
+    )
+    rows = db.execute(
+        select(chain.c.role, chain.c.content).order_by(chain.c.depth.desc())
+    ).all()
 
-    while current_id is not None and current_id not in visited:
-        visited.add(current_id)
-        msg = db.get(ChatMessage, current_id)
-        if not msg or msg.conversation_id != conversation_id:
-            break
-        history_msgs.append(msg)
-        current_id = msg.reply_to_message_id
+    return [{"role": row.role, "content": row.content} for row in rows]
 
-        if len(history_msgs) >= max_messages:
-            break
 
-    history_msgs.reverse()
-    return [{"role": m.role, "content": m.content} for m in history_msgs]
+@dataclass(slots=True)
+class ChatPrepared:
+    """Everything `chat` and `chat_stream` need before talking to the LLM."""
+    conversation: Conversation
+    active_doc_ids: list[int]
+    active_doc_names: list[str]
+    inactive_doc_names: list[str]
+    filenames: dict[int, str]
+    rag_signature: tuple
+    newest_chunk_at: datetime | None
+    chunks: list | None  # (document_id, content) rows, only loaded when requested
+    parent_reply_to: int | None
+    edit_group_id: int | None
+    version_index: int
+    regenerate_user_message_id: int | None
+    chat_history: list[dict]
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(
-    chat_request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
+
+def _find_conversation(db: Session, chat_request: ChatRequest, current_user) -> Conversation:
     conversation = (
         db.query(Conversation)
         .filter(Conversation.id == chat_request.conversation_id, Conversation.user_id == current_user.id)
@@ -94,66 +416,144 @@ async def chat(
 
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
 
-    # Get active document IDs
-    active_docs = (
-        db.query(Document)
-        .filter(Document.conversation_id == conversation.id, Document.is_active == True)
-        .all()
-    )
-    active_doc_ids = [doc.id for doc in active_docs]
-    active_doc_names = [doc.filename for doc in active_docs]
-
-    # Get all document names for context
-    all_docs = (
-        db.query(Document)
-        .filter(Document.conversation_id == conversation.id)
-        .all()
-    )
-    all_doc_names = [doc.filename for doc in all_docs]
-    inactive_doc_names = [doc.filename for doc in all_docs if doc.id not in active_doc_ids]
 
-    # Load only chunks from active documents
-    chunks = (
-        db.query(DocumentChunk)
-        .filter(
-            DocumentChunk.conversation_id == conversation.id,
-            DocumentChunk.document_id.in_(active_doc_ids) if active_doc_ids else True
+def _load_chat_documents(session_factory, conversation_id: int, with_chunks: bool) -> tuple:
+    """Load a conversation's documents and chunk statistics in a separate session.
+
+    Chunk rows themselves are only fetched when ``with_chunks`` is set; retrieval
+    only needs the statistics to check its cached processor.
+    Returns (active_doc_ids, active_doc_names, inactive_doc_names, filenames,
+    rag_signature, newest_chunk_at, chunks).
+    """
+    # Per-document chunk aggregates, joined onto the document list so one round trip
+    # yields both the names and the cache signature
+    chunk_stats = (
+        select(
+            DocumentChunk.document_id.label("document_id"),
+            func.count(DocumentChunk.id).label("chunk_count"),
+            func.max(DocumentChunk.id).label("max_chunk_id"),
+            func.max(DocumentChunk.created_at).label("newest_chunk_at"),
         )
-        .all()
+        .where(DocumentChunk.conversation_id == conversation_id)
+        .group_by(DocumentChunk.document_id)
+        .subquery()
     )
 
-    # Build context about which documents are active/inactive
-    doc_context_info = ""
-    if inactive_doc_names:
-        doc_context_info = f"\n\nNOTE: The user has disabled the following documents for this query: {', '.join(inactive_doc_names)}. If the user's question relates to disabled documents, inform them that the answer is based only on the active documents ({', '.join(active_doc_names) if active_doc_names else 'none'}) and conversation history."
+    db = session_factory()
+    try:
+        # Document content can be large and isn't needed here
+        all_docs = db.execute(
+            select(
+                Document.id,
+                Document.filename,
+                Document.is_active,
+                chunk_stats.c.chunk_count,
+                chunk_stats.c.max_chunk_id,
+                chunk_stats.c.newest_chunk_at,
+            )
+            .outerjoin(chunk_stats, chunk_stats.c.document_id == Document.id)
+            .where(Document.conversation_id == conversation_id)
+            .order_by(Document.id)
+        ).all()
+        active_docs = [doc for doc in all_docs if doc.is_active]
+        active_doc_ids = [doc.id for doc in active_docs]
+        active_doc_names = [doc.filename for doc in active_docs]
+        inactive_doc_names = [doc.filename for doc in all_docs if not doc.is_active]
+        filenames = {doc.id: doc.filename for doc in all_docs}
+
+        # Use only chunks from active documents; with none active, fall back to every chunk
+        chunk_filter = [DocumentChunk.conversation_id == conversation_id]
+        if active_doc_ids:
+            chunk_filter.append(DocumentChunk.document_id.in_(active_doc_ids))
+            chunk_count = sum(doc.chunk_count or 0 for doc in active_docs)
+            max_chunk_id = max((doc.max_chunk_id for doc in active_docs if doc.max_chunk_id), default=None)
+            newest_chunk_at = max(
+                (doc.newest_chunk_at for doc in active_docs if doc.newest_chunk_at), default=None
+            )
+        else:
+            # Includes chunks that aren't attached to any document
+            chunk_count, max_chunk_id, newest_chunk_at = (
+                db.query(func.count(DocumentChunk.id), func.max(DocumentChunk.id), func.max(DocumentChunk.created_at))
+                .filter(*chunk_filter)
+                .one()
+            )
+        rag_signature = _rag_signature(active_doc_ids, chunk_count, max_chunk_id)
+
+        chunks = None
+        if with_chunks:
+            # Document order, then position; chunks without a document sort first
+            chunks = (
+                db.query(DocumentChunk.document_id, DocumentChunk.content)
+                .filter(*chunk_filter)
+                .order_by(DocumentChunk.document_id, DocumentChunk.chunk_index)
+                .all()
+            )
+        return (
+            active_doc_ids, active_doc_names, inactive_doc_names, filenames,
+            rag_signature, newest_chunk_at, chunks,
+        )
+    finally:
+        db.close()
 
-    if not chunks:
-        # No chunks available, but we can still use chat history
-        chunk_dicts = []
-    else:
-        chunk_dicts = [
-            {
-                "content": chunk.content,
-                "metadata_json": chunk.metadata_json,
-                "chunk_index": chunk.chunk_index
-            }
-            for chunk in chunks
-        ]
 
+def _load_chunk_columns(conversation_id: int, active_doc_ids: list[int]) -> ChunkColumns:
+    """Fetch the fallback chunks a RAG processor keeps, for building one on a cache miss.
+
+    Only the leading FALLBACK_CHUNK_LIMIT chunks can ever be returned, so only those are read.
+    """
+    query = select(
+        DocumentChunk.content,
+        DocumentChunk.metadata_json,
+        DocumentChunk.chunk_index,
+    ).where(DocumentChunk.conversation_id == conversation_id)
+    if active_doc_ids:
+        query = query.where(DocumentChunk.document_id.in_(active_doc_ids))
+    query = query.order_by(DocumentChunk.id).limit(FALLBACK_CHUNK_LIMIT)
+
+    db = SessionLocal()
+    try:
+        return ChunkColumns.from_rows(db.execute(query).all())
+    finally:
+        db.close()
+
+
+def _resolve_chat_branch(
+    db: Session,
+    conversation: Conversation,
+    chat_request: ChatRequest,
+    with_history: bool,
+    streaming: bool,
+) -> tuple:
+    """Work out where the new turn attaches and load that branch's history.
+
+    A streaming regenerate answers the latest user turn again, while ``/chat``
+    saves a new user turn after the latest assistant message, as it always has.
+    Returns (parent_reply_to, edit_group_id, version_index, regenerate_user_message_id, chat_history).
+    """
     # Determine the parent message to chain from BEFORE building chat history.
-    # To prevent cross-branch corruption, require an explicit parent for follow-ups.
-    has_any_assistant = (
-        db.query(ChatMessage.id)
-        .filter(ChatMessage.conversation_id == conversation.id, ChatMessage.role == "assistant")
-        .first()
-        is not None
-    )
+    regenerate_user_message_id = None
+    if chat_request.regenerate:
+        last_user_msg = (
+            db.query(ChatMessage)
+            .filter(ChatMessage.conversation_id == conversation.id, ChatMessage.role == "user")
+            .order_by(ChatMessage.id.desc())
+            .first()
+        )
+        if last_user_msg:
+            regenerate_user_message_id = last_user_msg.id
 
-    if chat_request.parent_message_id is not None:
+    if chat_request.regenerate and streaming:
+        # Regenerate the latest user turn by default; an explicit parent_message_id wins.
+        parent_reply_to = last_user_msg.reply_to_message_id if last_user_msg else None
+        if chat_request.parent_message_id is not None:
+            parent_reply_to = _validate_parent_message_id(db, conversation.id, chat_request.parent_message_id)
+    elif chat_request.parent_message_id is not None:
         parent_reply_to = _validate_parent_message_id(db, conversation.id, chat_request.parent_message_id)
     else:
-        if has_any_assistant and (not chat_request.is_edit) and (not chat_request.regenerate):
+        # To prevent cross-branch corruption, require an explicit parent for follow-ups.
+        if not chat_request.is_edit and not chat_request.regenerate and _has_any_assistant(db, conversation.id):
             raise HTTPException(
                 status_code=400,
                 detail="parent_message_id is required for follow-up messages to preserve branching",
@@ -161,7 +561,11 @@ async def chat(
         parent_reply_to = _get_latest_assistant_id(db, conversation.id)
 
     # Determine edit_group_id/version_index, and for edits force the same parent as the original.
-    if chat_request.is_edit and chat_request.edit_group_id is not None:
+    # Old versions are NOT archived - all branches stay active. A streaming regenerate
+    # saves no user message, so it has no version to assign.
+    edit_group_id = None
+    version_index = 1
+    if not (chat_request.regenerate and streaming) and chat_request.is_edit and chat_request.edit_group_id is not None:
         original_message = (
             db.query(ChatMessage)
             .filter(
@@ -171,208 +575,322 @@ async def chat(
             )
             .first()
         )
-        if not original_message:
-            edit_group_id = None
-            version_index = 1
-        else:
+        if original_message:
             edit_group_id = original_message.edit_group_id or original_message.id
-            existing_versions = (
-                db.query(ChatMessage)
-                .filter(
-                    ChatMessage.conversation_id == conversation.id,
-                    ChatMessage.edit_group_id == edit_group_id,
-                    ChatMessage.role == "user",
-                )
-                .count()
-            )
-            version_index = existing_versions + 1
+            version_index = _next_version_index(db, conversation.id, edit_group_id)
             parent_reply_to = original_message.reply_to_message_id
-    else:
-        edit_group_id = None
-        version_index = 1
 
     # Load chat history ONLY from the active branch.
     # Do not include sibling branches in context.
-    max_history = 10 if conversation.llm_mode == "local" else 50
-    chat_history = _build_branch_chat_history(db, conversation.id, parent_reply_to, max_history)
+    chat_history = []
+    if with_history:
+        max_history = 10 if conversation.llm_mode == "local" else 50
+        chat_history = _build_branch_chat_history(db, conversation.id, parent_reply_to, max_history)
 
-    # Initialize Hybrid RAG Processor with Qdrant
-    conv_embedding_model_sync = getattr(conversation, 'embedding_model', 'custom')
-    hybrid_rag = HybridRAGProcessor(conversation_id=conversation.id, embedding_model_name=conv_embedding_model_sync)
-    hybrid_rag.load_documents(chunks=chunk_dicts, document_ids=active_doc_ids if active_doc_ids else None)
-    hybrid_rag.load_chat_history(chat_history)
+    return parent_reply_to, edit_group_id, version_index, regenerate_user_message_id, chat_history
 
-    llm_client = get_llm_client(conversation.llm_mode, chat_request.cloud_model)
 
-    is_summary_request = any(word in chat_request.message.lower() for word in [
-        'summarize', 'summary', 'summarise', 'sumary', 'brief',
-        'overview', 'gist', 'main points', 'key points', 'highlights'
-    ])
+async def _prepare_chat_context(
+    db: Session,
+    chat_request: ChatRequest,
+    current_user,
+    streaming: bool,
+    with_history: bool = True,
+    with_chunks: bool = False,
+) -> ChatPrepared:
+    """Load the conversation, its active documents and the branch being replied to.
+
+    The session is synchronous, so its queries run in worker threads. Documents
+    and the reply branch don't depend on each other and are loaded concurrently,
+    the documents through their own session. ``streaming`` selects the branch
+    rules of ``/chat/stream``. ``with_history=False`` skips the branch-history
+    walk and ``with_chunks=True`` loads the active chunk rows, for callers that
+    need them.
+    """
+    conversation = await asyncio.to_thread(_find_conversation, db, chat_request, current_user)
+
+    documents, branch = await asyncio.gather(
+        asyncio.to_thread(_load_chat_documents, SessionLocal, conversation.id, with_chunks),
+        asyncio.to_thread(_resolve_chat_branch, db, conversation, chat_request, with_history, streaming),
+    )
+    (
+        active_doc_ids, active_doc_names, inactive_doc_names, filenames,
+        rag_signature, newest_chunk_at, chunks,
+    ) = documents
+    parent_reply_to, edit_group_id, version_index, regenerate_user_message_id, chat_history = branch
+
+    return ChatPrepared(
+        conversation=conversation,
+        active_doc_ids=active_doc_ids,
+        active_doc_names=active_doc_names,
+        inactive_doc_names=inactive_doc_names,
+        filenames=filenames,
+        rag_signature=rag_signature,
+        newest_chunk_at=newest_chunk_at,
+        chunks=chunks,
+        parent_reply_to=parent_reply_to,
+        edit_group_id=edit_group_id,
+        version_index=version_index,
+        regenerate_user_message_id=regenerate_user_message_id,
+        chat_history=chat_history,
+    )
+
+
+def _load_hybrid_rag(prepared: ChatPrepared) -> HybridRAGProcessor:
+    """Reuse the conversation's RAG processor while its documents are unchanged.
+
+    Chunk rows are only read from the database when the processor has to be rebuilt;
+    a rebuild also sets up Qdrant, so callers run this in a worker thread.
+    The processor is shared, so the branch history is passed to ``build_context`` per call.
+    """
+    conversation_id = prepared.conversation.id
+    active_doc_ids = prepared.active_doc_ids
+    return get_hybrid_rag_processor(
+        conversation_id,
+        getattr(prepared.conversation, 'embedding_model', 'custom'),
+        prepared.rag_signature,
+        document_ids=active_doc_ids if active_doc_ids else None,
+        chunks_loader=lambda: _load_chunk_columns(conversation_id, active_doc_ids),
+    )
+
+
+def _answer_cache_scope(prepared: ChatPrepared, chat_request: ChatRequest) -> tuple:
+    """Scope for the semantic answer cache.
+
+    Follow-ups depend on the conversation so far, so answers are only shared between
+    requests on the same branch with the same history.
+    """
+    history_digest = hashlib.sha1()
+    for message in prepared.chat_history:
+        history_digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+    return (
+        prepared.conversation.llm_mode,
+        chat_request.cloud_model,
+        prepared.parent_reply_to,
+        history_digest.hexdigest(),
+    )
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    chat_request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    # Summaries never use retrieval or chat history, so decide that before any setup
+    summary_request = is_summary_request(chat_request.message)
+
+    prepared = await _prepare_chat_context(
+        db, chat_request, current_user, streaming=False,
+        with_history=not summary_request, with_chunks=summary_request
+    )
+    conversation = prepared.conversation
+    parent_reply_to = prepared.parent_reply_to
+    edit_group_id = prepared.edit_group_id
+    version_index = prepared.version_index
+    chat_history = prepared.chat_history
+
+    # Build context about which documents are active/inactive
+    doc_context_info = ""
+    if prepared.inactive_doc_names:
+        doc_context_info = f"\n\nNOTE: The user has disabled the following documents for this query: {', '.join(prepared.inactive_doc_names)}. If the user's question relates to disabled documents, inform them that the answer is based only on the active documents ({', '.join(prepared.active_doc_names) if prepared.active_doc_names else 'none'}) and conversation history."
+
+    llm_client = get_llm_client(conversation.llm_mode, chat_request.cloud_model)
 
     is_local = (conversation.llm_mode or "api") == "local"
     is_gemini = (conversation.llm_mode == "api" and chat_request.cloud_model == "gemini")
     
-    if is_summary_request:
-        all_chunks = []
-        if active_doc_ids:
-            for doc_id in active_doc_ids:
-                doc_chunks = db.query(DocumentChunk).filter(
-                    DocumentChunk.conversation_id == conversation.id,
-                    DocumentChunk.document_id == doc_id
-                ).order_by(DocumentChunk.chunk_index).all()
-                all_chunks.extend([{"content": chunk.content, "metadata": {"source": chunk.document.filename if chunk.document else "Unknown"}} for chunk in doc_chunks])
-        else:
-            doc_chunks = db.query(DocumentChunk).filter(
-                DocumentChunk.conversation_id == conversation.id
-            ).order_by(DocumentChunk.document_id, DocumentChunk.chunk_index).all()
-            all_chunks = [{"content": chunk.content, "metadata": {"source": chunk.document.filename if chunk.document else "Unknown"}} for chunk in doc_chunks]
-        
-        if not all_chunks:
-            raise HTTPException(status_code=400, detail="No documents found for summarization")
-        
+    if summary_request:
+        # Wait for the conversation's LLM lock while the chunks are sorted and tagged
+        # in a worker thread, instead of one after the other
+        lock_task = asyncio.create_task(acquire_llm_lock(conversation.id, timeout=500.0))
         try:
-            if is_local:
-                async with LLMRequestContext(conversation.id):
-                    summary_text = await hierarchical_summarization(
-                        all_chunks, llm_client, 30, is_local=True
-                    )
-            else:
-                async with LLMRequestContext(conversation.id):
-                    summary_text = await hierarchical_summarization(
-                        all_chunks, llm_client, 30, is_local=False
-                    )
-            
+            all_chunks = await asyncio.to_thread(
+                _collect_summary_chunks, prepared.chunks, prepared.filenames
+            )
+            if not all_chunks:
+                raise HTTPException(status_code=400, detail="No documents found for summarization")
+            lock_acquired = await lock_task
+        except BaseException:
+            await _abandon_lock_task(lock_task, conversation.id)
+            raise
+
+        if not lock_acquired:
+            raise HTTPException(status_code=503, detail="Service is busy. Please try again.")
+
+        try:
+            summary_text = await hierarchical_summarization(
+                all_chunks, llm_client, 30, is_local=is_local
+            )
             result = {"response": summary_text, "sources": [], "source_chunks": []}
         except TimeoutError:
             raise HTTPException(status_code=503, detail="Service is busy. Please try again.")
         except ValueError as exc:
             raise HTTPException(status_code=500, detail=str(exc))
+        finally:
+            await release_llm_lock(conversation.id)
     else:
-        print(f"[Chat] Query: '{chat_request.message[:100]}...'")
-        print(f"[Chat] Building hybrid context (doc_k=10, chat_k=3)...")
-        context_result = hybrid_rag.build_context(
-            query=chat_request.message,
-            chat_history=chat_history,
-            doc_k=10,
-            chat_k=3,
-            recent_messages=8
-        )
+        # Summaries read chunks directly, so the RAG processor is only needed here
+        hybrid_rag = await asyncio.to_thread(_load_hybrid_rag, prepared)
 
-        formatted_context_docs = [
-            {"page_content": doc["content"], "metadata": doc["metadata"]}
-            for doc in context_result["document_chunks"]
-        ]
-        print(f"[Chat] Found {len(formatted_context_docs)} document chunks")
+        logger.debug("[Chat] Query: %r", chat_request.message[:100])
+        # A near-duplicate of a recent question reuses its answer. Regenerating always asks the
+        # LLM, and so does an edit: it shares the original's branch and history, and a small
+        # change to the question would otherwise replay the old answer
+        cache_scope = _answer_cache_scope(prepared, chat_request)
+        result, query_emb = None, None
+        if not (chat_request.regenerate or chat_request.is_edit):
+            result, query_emb = await asyncio.to_thread(
+                hybrid_rag.find_cached_answer, chat_request.message, cache_scope
+            )
 
-        recent_context = context_result.get("recent_context", [])
-        combined_context = context_result.get("combined_context", "") + doc_context_info
+        if result is not None:
+            logger.debug("[Chat] Reusing the answer to a near-duplicate question")
+        else:
+            # Regenerating the same prompt over unchanged documents: skip the Qdrant retrieval
+            cached_chunks = None
+            if chat_request.regenerate and prepared.regenerate_user_message_id is not None:
+                cached_chunks = await asyncio.to_thread(
+                    _cached_regenerate_chunks,
+                    db,
+                    prepared,
+                    prepared.regenerate_user_message_id,
+                    chat_request.message,
+                )
+
+            logger.debug("[Chat] Building hybrid context (doc_k=10, chat_k=3)")
+            # Embedding, search and reranking block, so they run in a worker thread
+            context_result = await asyncio.to_thread(
+                hybrid_rag.build_context,
+                query=chat_request.message,
+                chat_history=chat_history,
+                doc_k=10,
+                chat_k=3,
+                recent_messages=8,
+                document_chunks=cached_chunks,
+                query_embedding=query_emb
+            )
+
+            formatted_context_docs = [
+                {"page_content": doc["content"], "metadata": doc["metadata"]}
+                for doc in context_result["document_chunks"]
+            ]
+            logger.debug("[Chat] Found %d document chunks", len(formatted_context_docs))
+
+            recent_context = context_result.get("recent_context", [])
+            combined_context = context_result.get("combined_context", "") + doc_context_info
         
-        import time
-        start_time = time.time()
-        print(f"[Chat] Starting generation...")
-        try:
-            if is_local:
-                async with LLMRequestContext(conversation.id):
-                    result = await llm_client.generate_response(
-                        chat_request.message,
-                        formatted_context_docs,
-                        recent_context,
-                        combined_context
-                    )
-            else:
-                async with LLMRequestContext(conversation.id):
-                    result = await llm_client.generate_response(
-                        chat_request.message,
-                        formatted_context_docs,
-                        recent_context,
-                        combined_context
-                    )
-            elapsed = time.time() - start_time
-            print(f"[Chat] Completed in {elapsed:.2f}s")
-        except TimeoutError:
-            raise HTTPException(status_code=503, detail="Ollama is busy. Please try again.")
-        except ValueError as exc:
-            raise HTTPException(status_code=500, detail=str(exc))
+            import time
+            start_time = time.time()
+            logger.debug("[Chat] Starting generation")
+            try:
+                if is_local:
+                    async with LLMRequestContext(conversation.id):
+                        result = await llm_client.generate_response(
+                            chat_request.message,
+                            formatted_context_docs,
+                            recent_context,
+                            combined_context
+                        )
+                else:
+                    async with LLMRequestContext(conversation.id):
+                        result = await llm_client.generate_response(
+                            chat_request.message,
+                            formatted_context_docs,
+                            recent_context,
+                            combined_context
+                        )
+                elapsed = time.time() - start_time
+                logger.debug("[Chat] Completed in %.2fs", elapsed)
+            except TimeoutError:
+                raise HTTPException(status_code=503, detail="Ollama is busy. Please try again.")
+            except ValueError as exc:
+                raise HTTPException(status_code=500, detail=str(exc))
 
-    user_message = ChatMessage(
-        conversation_id=conversation.id,
-        role="user",
-        content=chat_request.message,
-        reply_to_message_id=parent_reply_to,
-        edit_group_id=edit_group_id,
-        version_index=version_index,
-        is_edited=1 if (chat_request.is_edit and edit_group_id is not None and version_index > 1) else 0,
-    )
-    db.add(user_message)
-    db.flush()
-    
-    # For new messages, set edit_group_id to its own ID
-    if edit_group_id is None:
-        user_message.edit_group_id = user_message.id
+            if query_emb is not None and result.get("response"):
+                hybrid_rag.cache_answer(query_emb, cache_scope, result)
 
-    assistant_message = ChatMessage(
-        conversation_id=conversation.id,
-        role="assistant",
-        content=result["response"],
-        sources_json="||".join(result["sources"]) if result["sources"] else None,
-        source_chunks_json=json.dumps(result.get("source_chunks", [])) if result.get("source_chunks") else None,
-        prompt_snapshot=chat_request.message,
-        reply_to_message_id=user_message.id,
-        version_index=1,
-        is_archived=False
+    is_edited = 1 if (chat_request.is_edit and edit_group_id is not None and version_index > 1) else 0
+    user_message_id, user_created_at, assistant_message_id, assistant_created_at = await asyncio.to_thread(
+        _save_chat_turn,
+        db,
+        {
+            "conversation_id": conversation.id,
+            "role": "user",
+            "content": chat_request.message,
+            "reply_to_message_id": parent_reply_to,
+            "edit_group_id": edit_group_id,
+            "version_index": version_index,
+            "is_edited": is_edited,
+        },
+        {
+            "conversation_id": conversation.id,
+            "role": "assistant",
+            "content": result["response"],
+            "sources_json": result["sources"] or None,
+            "source_chunks_json": json.dumps(result.get("source_chunks", [])) if result.get("source_chunks") else None,
+            "prompt_snapshot": chat_request.message,
+            "version_index": 1,
+            "is_archived": False,
+        },
     )
+    # Only the conversation list's ordering depends on this, so it needn't delay the reply
+    background_tasks.add_task(_touch_conversation, conversation.id)
 
-    db.add(assistant_message)
-    conversation.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(user_message)
-    db.refresh(assistant_message)
-
-    response_variant = ResponseVariant(
-        id=assistant_message.id,
-        version_index=assistant_message.version_index,
-        content=assistant_message.content,
-        sources=result["sources"],
-        source_chunks=result.get("source_chunks", []),
+    # Every value below was produced by this handler or read back from the insert, so the
+    # payload models are assembled without re-running field validation. The reply is
+    # serialized here: returning the model would make FastAPI validate it against
+    # response_model, which then only documents the schema
+    sources = result["sources"]
+    source_chunks = [SourceWithChunk.model_construct(**chunk) for chunk in result.get("source_chunks") or []]
+
+    response_variant = ResponseVariant.model_construct(
+        id=assistant_message_id,
+        version_index=1,
+        content=result["response"],
+        sources=sources,
+        source_chunks=source_chunks,
         is_active=True,
-        created_at=assistant_message.created_at,
+        created_at=assistant_created_at,
         prompt_content=chat_request.message
     )
 
-    user_message_payload = ChatMessageResponse(
-        id=user_message.id,
-        role=user_message.role,
-        content=user_message.content,
+    user_message_payload = ChatMessageResponse.model_construct(
+        id=user_message_id,
+        role="user",
+        content=chat_request.message,
         sources=[],
-        created_at=user_message.created_at,
-        is_edited=user_message.is_edited,
-        reply_to_message_id=user_message.reply_to_message_id,
-        version_index=user_message.version_index,
-        is_archived=user_message.is_archived,
+        created_at=user_created_at,
+        is_edited=is_edited,
+        reply_to_message_id=parent_reply_to,
+        version_index=version_index,
+        is_archived=False,
         response_versions=[response_variant]
     )
 
-    assistant_message_payload = ChatMessageResponse(
-        id=assistant_message.id,
-        role=assistant_message.role,
-        content=assistant_message.content,
-        sources=result["sources"],
-        source_chunks=result.get("source_chunks", []),
-        created_at=assistant_message.created_at,
-        is_edited=assistant_message.is_edited,
-        reply_to_message_id=assistant_message.reply_to_message_id,
-        version_index=assistant_message.version_index,
-        is_archived=assistant_message.is_archived
+    assistant_message_payload = ChatMessageResponse.model_construct(
+        id=assistant_message_id,
+        role="assistant",
+        content=result["response"],
+        sources=sources,
+        source_chunks=source_chunks,
+        created_at=assistant_created_at,
+        is_edited=0,
+        reply_to_message_id=user_message_id,
+        version_index=1,
+        is_archived=False
     )
 
-    return ChatResponse(
+    chat_response = ChatResponse.model_construct(
         response=result["response"],
-        sources=result["sources"],
-        source_chunks=result.get("source_chunks", []),
+        sources=sources,
+        source_chunks=source_chunks,
         user_message=user_message_payload,
         assistant_message=assistant_message_payload,
         response_versions=[response_variant]
     )
+    return Response(content=chat_response.model_dump_json(), media_type="application/json")
 
 
 @router.post("/chat/stream")
@@ -382,59 +900,17 @@ async def chat_stream(
     current_user = Depends(get_current_user)
 ):
     """Streaming chat endpoint for word-by-word responses."""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == chat_request.conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-
-    # Get active document IDs
-    active_docs = (
-        db.query(Document)
-        .filter(Document.conversation_id == conversation.id, Document.is_active == True)
-        .all()
-    )
-    active_doc_ids = [doc.id for doc in active_docs]
-    active_doc_names = [doc.filename for doc in active_docs]
-
-    # Get all document names for context
-    all_docs = (
-        db.query(Document)
-        .filter(Document.conversation_id == conversation.id)
-        .all()
-    )
-    inactive_doc_names = [doc.filename for doc in all_docs if doc.id not in active_doc_ids]
-
-    # Load only chunks from active documents
-    chunks = (
-        db.query(DocumentChunk)
-        .filter(
-            DocumentChunk.conversation_id == conversation.id,
-            DocumentChunk.document_id.in_(active_doc_ids) if active_doc_ids else True
-        )
-        .all()
-    )
+    prepared = await _prepare_chat_context(db, chat_request, current_user, streaming=True)
+    conversation = prepared.conversation
+    parent_reply_to = prepared.parent_reply_to
+    edit_group_id = prepared.edit_group_id
+    version_index = prepared.version_index
+    chat_history = prepared.chat_history
 
     # Build context about which documents are active/inactive
     doc_context_info = ""
-    if inactive_doc_names:
-        doc_context_info = f"\n\nNOTE: The user has disabled the following documents: {', '.join(inactive_doc_names)}."
-
-    chunk_dicts = [
-        {
-            "content": chunk.content,
-            "metadata_json": chunk.metadata_json,
-            "chunk_index": chunk.chunk_index
-        }
-        for chunk in chunks
-    ] if chunks else []
-
-
-    # Build chat history from the active branch only.
-    max_history = 10 if conversation.llm_mode == "local" else 50
+    if prepared.inactive_doc_names:
+        doc_context_info = f"\n\nNOTE: The user has disabled the following documents: {', '.join(prepared.inactive_doc_names)}."
 
     # Build context - reduce for local mode
     if conversation.llm_mode == "local":
@@ -444,186 +920,163 @@ async def chat_stream(
 
     # Capture conversation ID before session closes
     conv_id = conversation.id
-    
+
     # Only save user message if not regenerating
-    user_message_id = None
-    edit_group_id = None
-    parent_reply_to = None
+    user_message_id = prepared.regenerate_user_message_id
 
-    # Determine the parent/tail BEFORE building any context.
-    if chat_request.regenerate:
-        # Existing behavior: regenerate the latest user turn by default.
-        # If the client provides an explicit parent_message_id, prefer it.
-        last_user_msg = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.conversation_id == conv_id, ChatMessage.role == "user")
-            .order_by(ChatMessage.id.desc())
-            .first()
-        )
-        if last_user_msg:
-            user_message_id = last_user_msg.id
-            parent_reply_to = last_user_msg.reply_to_message_id
+    hybrid_rag = await asyncio.to_thread(_load_hybrid_rag, prepared)
 
-        if chat_request.parent_message_id is not None:
-            parent_reply_to = _validate_parent_message_id(db, conv_id, chat_request.parent_message_id)
-    else:
-        # Determine the parent message to chain from.
-        # Priority: explicit parent_message_id (validated) > latest assistant in this conversation.
-        has_any_assistant = (
-            db.query(ChatMessage.id)
-            .filter(ChatMessage.conversation_id == conv_id, ChatMessage.role == "assistant")
-            .first()
-            is not None
+    # A near-duplicate of a recent question reuses its answer. Regenerating always asks the
+    # LLM, and so does an edit: it shares the original's branch and history, and a small
+    # change to the question would otherwise replay the old answer
+    cache_scope = _answer_cache_scope(prepared, chat_request)
+    cached_result, query_emb = None, None
+    if not (chat_request.regenerate or chat_request.is_edit):
+        cached_result, query_emb = await asyncio.to_thread(
+            hybrid_rag.find_cached_answer, chat_request.message, cache_scope
         )
 
-        if chat_request.parent_message_id is not None:
-            parent_reply_to = _validate_parent_message_id(db, conv_id, chat_request.parent_message_id)
-        else:
-            if has_any_assistant and (not chat_request.is_edit):
-                raise HTTPException(
-                    status_code=400,
-                    detail="parent_message_id is required for follow-up messages to preserve branching",
-                )
-            parent_reply_to = _get_latest_assistant_id(db, conv_id)
+    if cached_result is not None:
+        sources = cached_result["sources"]
+        source_chunks = cached_result.get("source_chunks", [])
+    else:
+        # Regenerating the same prompt over unchanged documents: skip the Qdrant retrieval
+        cached_chunks = None
+        if chat_request.regenerate and user_message_id is not None:
+            cached_chunks = await asyncio.to_thread(
+                _cached_regenerate_chunks, db, prepared, user_message_id, chat_request.message
+            )
 
-    chat_history = _build_branch_chat_history(db, conv_id, parent_reply_to, max_history)
+        # Embedding, search and reranking block, so they run in a worker thread
+        context_result = await asyncio.to_thread(
+            hybrid_rag.build_context,
+            query=chat_request.message,
+            chat_history=chat_history,
+            doc_k=doc_k,
+            chat_k=chat_k,
+            recent_messages=recent_msgs,
+            document_chunks=cached_chunks,
+            query_embedding=query_emb
+        )
 
-    # Initialize RAG processor with Qdrant
-    conv_embedding_model = getattr(conversation, 'embedding_model', 'custom')
-    hybrid_rag = HybridRAGProcessor(conversation_id=conv_id, embedding_model_name=conv_embedding_model)
-    hybrid_rag.load_documents(chunks=chunk_dicts, document_ids=active_doc_ids if active_doc_ids else None)
-    hybrid_rag.load_chat_history(chat_history)
+        formatted_context_docs = [
+            {
+                "page_content": doc["content"],
+                "metadata": doc["metadata"]
+            }
+            for doc in context_result["document_chunks"]
+        ]
 
-    context_result = hybrid_rag.build_context(
-        query=chat_request.message,
-        chat_history=chat_history,
-        doc_k=doc_k,
-        chat_k=chat_k,
-        recent_messages=recent_msgs
-    )
+        recent_context = context_result.get("recent_context", [])
+        combined_context = context_result.get("combined_context", "") + doc_context_info
 
-    formatted_context_docs = [
-        {
-            "page_content": doc["content"],
-            "metadata": doc["metadata"]
-        }
-        for doc in context_result["document_chunks"]
-    ]
+        sources = list(set(
+            doc["metadata"].get("source", "Unknown")
+            for doc in context_result["document_chunks"]
+        ))
+        source_chunks = []
+        for i, doc in enumerate(context_result["document_chunks"]):
+            source = doc["metadata"].get("source", "Unknown")
+            source_chunks.append({
+                "index": i + 1,
+                "source": source,
+                "chunk": doc["content"][:800]
+            })
 
-    recent_context = context_result.get("recent_context", [])
-    combined_context = context_result.get("combined_context", "") + doc_context_info
-
-    sources = list(set(
-        doc["metadata"].get("source", "Unknown")
-        for doc in context_result["document_chunks"]
-    ))
-    source_chunks = []
-    for i, doc in enumerate(context_result["document_chunks"]):
-        source = doc["metadata"].get("source", "Unknown")
-        source_chunks.append({
-            "index": i + 1,
-            "source": source,
-            "chunk": doc["content"][:800]
-        })
+    # Encode the stored forms once; both the success and error save paths reuse them
+    sources_json = sources or None
+    source_chunks_json = json.dumps(source_chunks) if source_chunks else None
 
     llm_client = get_llm_client(conversation.llm_mode, chat_request.cloud_model)
     is_local = (conversation.llm_mode or "api") == "local"
     
+    # Start waiting for the LLM lock now so it overlaps the user-message commit;
+    # a cached answer never reaches the LLM. The body generator takes the task over
+    # when it starts; until then release_unclaimed_lock owns it
+    lock_task = None
+    lock_claimed = False
+    if cached_result is None:
+        lock_task = asyncio.create_task(acquire_llm_lock(conv_id, timeout=300.0))
+
+    async def release_unclaimed_lock():
+        if lock_task is not None and not lock_claimed:
+            await _abandon_lock_task(lock_task, conv_id)
+
     if not chat_request.regenerate:
-        # Determine edit_group_id and version_index
-        if chat_request.is_edit and chat_request.edit_group_id is not None:
-            # This is an edit - create new version in the edit group
-            # DO NOT archive the old version - keep all branches active
-            original_message = (
-                db.query(ChatMessage)
-                .filter(
-                    ChatMessage.id == chat_request.edit_group_id,
-                    ChatMessage.conversation_id == conv_id,
-                    ChatMessage.role == "user",
-                )
-                .first()
-            )
-            if not original_message:
-                edit_group_id = None
-                version_index = 1
-            else:
-                edit_group_id = original_message.edit_group_id or original_message.id
-            
-            # Count existing versions in this group
-            existing_versions = (
-                db.query(ChatMessage)
-                .filter(
-                    ChatMessage.conversation_id == conv_id,
-                    ChatMessage.edit_group_id == edit_group_id,
-                    ChatMessage.role == "user"
-                )
-                .count()
-            )
-            version_index = existing_versions + 1
-            
-            # For edits, the parent should be the same as the original message's parent
-            parent_reply_to = original_message.reply_to_message_id
-        else:
-            # New message - will set edit_group_id to its own ID after creation
-            edit_group_id = None
-            version_index = 1
-        
-        user_message = ChatMessage(
-            conversation_id=conv_id,
-            role="user",
-            content=chat_request.message,
-            edit_group_id=edit_group_id,
-            version_index=version_index,
-            reply_to_message_id=parent_reply_to,
-            is_edited=1 if (chat_request.is_edit and edit_group_id is not None and version_index > 1) else 0,
+        try:
+            user_message_id, edit_group_id = await asyncio.to_thread(_save_user_message, {
+                "conversation_id": conv_id,
+                "role": "user",
+                "content": chat_request.message,
+                "edit_group_id": edit_group_id,
+                "version_index": version_index,
+                "reply_to_message_id": parent_reply_to,
+                "is_edited": 1 if (chat_request.is_edit and edit_group_id is not None and version_index > 1) else 0,
+            })
+        except BaseException:
+            await release_unclaimed_lock()
+            raise
+
+    # Build the meta frame once as bytes, splicing in the already-encoded source chunks
+    meta_frame = _meta_frame(sources, source_chunks_json, user_message_id, edit_group_id)
+
+    async def replay_cached_answer():
+        full_response = cached_result["response"]
+        yield meta_frame
+        yield _token_frame(full_response)
+
+        (assistant_message_id,) = await asyncio.to_thread(
+            _save_stream_messages,
+            [{
+                "conversation_id": conv_id,
+                "role": "assistant",
+                "content": full_response,
+                "sources_json": sources_json,
+                "source_chunks_json": source_chunks_json,
+                "prompt_snapshot": chat_request.message,
+                "reply_to_message_id": user_message_id,
+                "version_index": 1,
+                "is_archived": False,
+            }],
+            conv_id,
         )
-        db.add(user_message)
-        db.flush()
-        user_message_id = user_message.id
-        
-        # For new messages, set edit_group_id to its own ID
-        if edit_group_id is None:
-            user_message.edit_group_id = user_message.id
-            edit_group_id = user_message.id
-        
-        db.commit()
+        yield _done_frame(assistant_message_id, full_response, False)
 
     async def generate_stream():
+        nonlocal lock_claimed
+        lock_claimed = True
         full_response = ""
         error_occurred = False
         
-        # Send initial metadata
-        yield f"data: {json.dumps({'type': 'meta', 'sources': sources, 'source_chunks': source_chunks, 'user_message_id': user_message_id, 'edit_group_id': edit_group_id})}\n\n"
-        
-        # Acquire LLM lock for this conversation
-        lock_acquired = await acquire_llm_lock(conv_id, timeout=300.0)
+        try:
+            # Send initial metadata, then pick up the lock requested before the save
+            yield meta_frame
+            lock_acquired = await lock_task
+        except BaseException:
+            # Client went away before generation started; don't leave the lock held
+            await _abandon_lock_task(lock_task, conv_id)
+            raise
         
         if not lock_acquired:
             # Save error assistant message to prevent orphaned user message
-            err_session = SessionLocal()
-            try:
-                err_msg = ChatMessage(
-                    conversation_id=conv_id,
-                    role="assistant",
-                    content="[Error: Another request is in progress. Please wait and try again.]",
-                    reply_to_message_id=user_message_id,
-                    version_index=1,
-                    is_archived=False
-                )
-                err_session.add(err_msg)
-                err_session.commit()
-            finally:
-                err_session.close()
-            yield f"data: {json.dumps({'type': 'error', 'message': 'Another request is in progress. Please wait and try again.'})}\n\n"
+            await asyncio.to_thread(_save_stream_messages, [{
+                "conversation_id": conv_id,
+                "role": "assistant",
+                "content": "[Error: Another request is in progress. Please wait and try again.]",
+                "reply_to_message_id": user_message_id,
+                "version_index": 1,
+                "is_archived": False,
+            }])
+            yield _BUSY_FRAME
             return
         
-        print(f"[Chat Stream] Query: '{chat_request.message[:100]}...'")
-        print(f"[Chat Stream] Found {len(formatted_context_docs)} document chunks")
+        logger.debug("[Chat Stream] Query: %r", chat_request.message[:100])
+        logger.debug("[Chat Stream] Found %d document chunks", len(formatted_context_docs))
         
         import time
         start_time = time.time()
         token_count = 0
-        print(f"[Chat Stream] Starting generation...")
+        logger.debug("[Chat Stream] Starting generation")
         
         try:
             # Check if streaming is supported (local mode)
@@ -638,7 +1091,7 @@ async def chat_stream(
                         ):
                             full_response += token
                             token_count += 1
-                            yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
+                            yield _token_frame(token)
                     else:
                         async for token in llm_client.generate_response_stream(
                             chat_request.message,
@@ -648,11 +1101,11 @@ async def chat_stream(
                         ):
                             full_response += token
                             token_count += 1
-                            yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
+                            yield _token_frame(token)
                 except Exception as e:
                     error_occurred = True
                     error_message = str(e)
-                    yield f"data: {json.dumps({'type': 'error', 'message': error_message})}\n\n"
+                    yield _error_frame(error_message)
             else:
                 try:
                     result = await llm_client.generate_response(
@@ -662,86 +1115,70 @@ async def chat_stream(
                         combined_context
                     )
                     full_response = result["response"]
-                    words = full_response.split(' ')
-                    for i, word in enumerate(words):
-                        token = word + (' ' if i < len(words) - 1 else '')
-                        yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
+                    if chat_request.fake_stream:
+                        words = full_response.split(' ')
+                        for i, word in enumerate(words):
+                            token = word + (' ' if i < len(words) - 1 else '')
+                            yield _token_frame(token)
+                    else:
+                        # The reply is already complete; send it as a single token frame
+                        yield _token_frame(full_response)
                 except Exception as e:
                     error_occurred = True
                     error_message = str(e)
-                    yield f"data: {json.dumps({'type': 'error', 'message': error_message})}\n\n"
+                    yield _error_frame(error_message)
         except TimeoutError:
             error_occurred = True
-            yield f"data: {json.dumps({'type': 'error', 'message': 'Ollama is busy with another request. Please wait.'})}\n\n"
+            yield _OLLAMA_BUSY_FRAME
         finally:
             await release_llm_lock(conv_id)
 
         # Save assistant message after streaming completes (even on error to prevent orphaned user messages)
         elapsed = time.time() - start_time
-        print(f"[Chat Stream] Generated {token_count} tokens in {elapsed:.2f}s")
+        logger.debug("[Chat Stream] Generated %d tokens in %.2fs", token_count, elapsed)
         
         # Clean up prompt echo and hallucinated artifacts from local LLM output
-        import re as _re
-        full_response = _re.sub(r'\n*\bQUESTION\s*:.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n*\bREMINDER\s*:.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n*\bDOCUMENTS\s*:.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n*\bPREVIOUS CHAT\s*:.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n+(?:Q(?:uestion)?|A(?:nswer)?)\s*:\s*.+$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n*\bPlease note\b.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n*\bNote\s*:.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = _re.sub(r'\n*\bImportant\s*:.*$', '', full_response, flags=_re.DOTALL | _re.IGNORECASE)
-        full_response = full_response.strip()
+        full_response = TRAILING_ARTIFACT_RE.sub('', full_response).strip()
         
-        session = SessionLocal()
-        try:
-            if error_occurred:
-                # Save partial response with error marker so user message isn't orphaned
-                error_content = full_response if full_response else ""
-                if error_content:
-                    error_content += "\n\n[Error: Response generation failed]"
-                else:
-                    error_content = "[Error: Response generation failed]"
-                assistant_message = ChatMessage(
-                    conversation_id=conv_id,
-                    role="assistant",
-                    content=error_content,
-                    sources_json="||".join(sources) if sources else None,
-                    source_chunks_json=json.dumps(source_chunks) if source_chunks else None,
-                    prompt_snapshot=chat_request.message,
-                    reply_to_message_id=user_message_id,
-                    version_index=1,
-                    is_archived=False
-                )
-                session.add(assistant_message)
-                session.commit()
-                session.refresh(assistant_message)
-                yield f"data: {json.dumps({'type': 'done', 'assistant_message_id': assistant_message.id, 'full_response': error_content, 'error': True})}\n\n"
+        if error_occurred:
+            # Save partial response with error marker so user message isn't orphaned
+            if full_response:
+                full_response += "\n\n[Error: Response generation failed]"
             else:
-                assistant_message = ChatMessage(
-                    conversation_id=conv_id,
-                    role="assistant",
-                    content=full_response,
-                    sources_json="||".join(sources) if sources else None,
-                    source_chunks_json=json.dumps(source_chunks) if source_chunks else None,
-                    prompt_snapshot=chat_request.message,
-                    reply_to_message_id=user_message_id,
-                    version_index=1,
-                    is_archived=False
-                )
-                session.add(assistant_message)
-                session.query(Conversation).filter(Conversation.id == conv_id).update(
-                    {"updated_at": datetime.utcnow()}
-                )
-                session.commit()
-                session.refresh(assistant_message)
-                
-                # Send final message with IDs
-                yield f"data: {json.dumps({'type': 'done', 'assistant_message_id': assistant_message.id, 'full_response': full_response})}\n\n"
-        finally:
-            session.close()
+                full_response = "[Error: Response generation failed]"
+
+        if not error_occurred and full_response and query_emb is not None:
+            hybrid_rag.cache_answer(query_emb, cache_scope, {
+                "response": full_response,
+                "sources": sources,
+                "source_chunks": source_chunks,
+            })
+
+        # The write runs in a worker thread so other streams keep flowing during the commit
+        (assistant_message_id,) = await asyncio.to_thread(
+            _save_stream_messages,
+            [{
+                "conversation_id": conv_id,
+                "role": "assistant",
+                "content": full_response,
+                "sources_json": sources_json,
+                "source_chunks_json": source_chunks_json,
+                "prompt_snapshot": chat_request.message,
+                "reply_to_message_id": user_message_id,
+                "version_index": 1,
+                "is_archived": False,
+            }],
+            None if error_occurred else conv_id,
+        )
+
+        # Send final message with IDs
+        yield _done_frame(assistant_message_id, full_response, error_occurred)
 
-    return StreamingResponse(
-        generate_stream(),
+    if cached_result is not None:
+        logger.debug("[Chat Stream] Reusing the answer to a near-duplicate question")
+    return _CleanupStreamingResponse(
+        generate_stream() if cached_result is None else replay_cached_answer(),
+        cleanup=release_unclaimed_lock,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -1,22 +1,26 @@
 from typing import List
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session, raiseload
 from pydantic import BaseModel
 import json
 
 logger = logging.getLogger(__name__)
 
 from ..dependencies import get_db, get_current_user
-from ..models.db_models import Conversation, Document, DocumentChunk
+from ..models.db_models import ChatMessage, Conversation, Document, DocumentChunk
 from ..models.schemas import (
     ConversationSummary,
     ConversationDetailResponse,
     ChatMessageResponse,
-    ResponseVariant
+    DocumentResponse,
+    NoteResponse,
+    ResponseVariant,
+    SourceWithChunk
 )
 from ..utils.document_processor import DocumentProcessor
-from ..utils.embeddings import EmbeddingProcessor, QdrantVectorStore
+from ..utils.embeddings import EmbeddingProcessor, QdrantVectorStore, invalidate_hybrid_rag_processor
 
 router = APIRouter(tags=["conversations"])
 
@@ -34,30 +38,78 @@ class NoteUpdate(BaseModel):
 class DocumentToggle(BaseModel):
     is_active: bool
 
+
+def _get_owned_document(db: Session, conversation_id: int, document_id: int, user_id: int, doc_type: str = None):
+    """Fetch a document and its conversation's embedding model in one JOIN on the ownership check.
+
+    Returns (document, embedding_model), or None when the document is not in one of the user's conversations.
+    """
+    query = (
+        db.query(Document, Conversation.embedding_model)
+        .join(Conversation, Document.conversation_id == Conversation.id)
+        .filter(
+            Document.id == document_id,
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id,
+        )
+    )
+    if doc_type is not None:
+        query = query.filter(Document.doc_type == doc_type)
+    return query.first()
+
+
+def _bump_conversation_version(db: Session, conversation_id: int) -> None:
+    """Bump the version so the conversation's ETag changes; committed with the caller's transaction.
+
+    updated_at is left alone, since it orders the conversation list.
+    """
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(version=func.coalesce(Conversation.version, 0) + 1)
+    )
+
 @router.get("/conversations", response_model=List[ConversationSummary])
 def list_conversations(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    conversations = (
-        db.query(Conversation)
-        .filter(Conversation.user_id == current_user.id)
-        .order_by(Conversation.updated_at.desc())
-        .all()
+    # Each conversation's newest message comes from a correlated subquery in the
+    # same SELECT, instead of lazy-loading every conversation's messages
+    last_message_subquery = (
+        select(ChatMessage.content)
+        .where(ChatMessage.conversation_id == Conversation.id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(1)
+        .correlate(Conversation)
+        .scalar_subquery()
     )
+    # Only the summary columns are selected, so no Conversation objects are built
+    conversations = db.execute(
+        select(
+            Conversation.id,
+            Conversation.title,
+            Conversation.created_at,
+            Conversation.updated_at,
+            Conversation.llm_mode,
+            Conversation.embedding_model,
+            last_message_subquery.label("last_message"),
+        )
+        .where(Conversation.user_id == current_user.id)
+        .order_by(Conversation.updated_at.desc())
+    ).all()
 
     summaries = []
     for convo in conversations:
-        last_message = convo.messages[-1].content if convo.messages else None
         summaries.append(
             ConversationSummary(
                 id=convo.id,
                 title=convo.title,
                 created_at=convo.created_at,
                 updated_at=convo.updated_at,
-                last_message=last_message,
-                llm_mode=getattr(convo, "llm_mode", "api"),
-                embedding_model=getattr(convo, "embedding_model", "custom")
+                last_message=convo.last_message,
+                llm_mode=convo.llm_mode or "api",
+                embedding_model=convo.embedding_model or "custom"
             )
         )
     return summaries
@@ -65,11 +117,15 @@ def list_conversations(
 @router.get("/conversations/{conversation_id}", response_model=ConversationDetailResponse)
 def get_conversation(
     conversation_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
+    # Documents and messages come from their own queries below; any relationship
+    # access here would be an accidental lazy load, so it raises
     conversation = (
         db.query(Conversation)
+        .options(raiseload("*"))
         .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
         .first()
     )
@@ -77,14 +133,26 @@ def get_conversation(
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
 
+    # Routes that change documents, notes or messages bump the version; the newest message
+    # id also covers chat replies, whose updated_at bump runs after the response is sent
+    latest_message_id = db.execute(
+        select(func.max(ChatMessage.id)).where(ChatMessage.conversation_id == conversation.id)
+    ).scalar()
+    updated_at = conversation.updated_at.timestamp() if conversation.updated_at else 0
+    etag = f'W/"{updated_at}-{conversation.version or 0}-{conversation.id}-{latest_message_id or 0}"'
+    if_none_match = request.headers.get("if-none-match")
+    # no-cache keeps the browser revalidating with If-None-Match instead of reusing a stale copy
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
     # Fallback preview cache: source -> representative chunk text
     source_preview = {}
     try:
-        for chunk in (
-            db.query(DocumentChunk)
-            .filter(DocumentChunk.conversation_id == conversation.id)
+        for chunk in db.execute(
+            select(DocumentChunk.content, DocumentChunk.metadata_json)
+            .where(DocumentChunk.conversation_id == conversation.id)
             .order_by(DocumentChunk.chunk_index.asc())
-            .all()
         ):
             if not chunk.metadata_json or not chunk.content:
                 continue
@@ -108,44 +176,65 @@ def get_conversation(
             for i, src in enumerate(sources_list or [])
         ]
 
-    summary = ConversationSummary(
+    def _source_chunks(msg):
+        chunks = (
+            json.loads(msg.source_chunks_json)
+            if msg.source_chunks_json
+            else _fallback_source_chunks(msg.sources_json)
+        )
+        return [SourceWithChunk.model_construct(**chunk) for chunk in chunks]
+
+    # Messages in creation order, each tagged with its position among the replies to the
+    # same parent (version first, then age), so response variants need no sorting here
+    variant_rank = func.row_number().over(
+        partition_by=ChatMessage.reply_to_message_id,
+        order_by=(func.coalesce(ChatMessage.version_index, 0), ChatMessage.created_at),
+    ).label("variant_rank")
+    variant_count = func.count().over(partition_by=ChatMessage.reply_to_message_id).label("variant_count")
+    message_rows = (
+        db.query(ChatMessage, variant_rank, variant_count)
+        .filter(ChatMessage.conversation_id == conversation.id)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .all()
+    )
+    conversation_messages = [message for message, _, _ in message_rows]
+
+    # Every value below comes from typed columns or JSON this app wrote itself, so the
+    # payload models are assembled without re-running field validation. The reply is
+    # serialized here: returning the model would make FastAPI validate it against
+    # response_model, which then only documents the schema
+    summary = ConversationSummary.model_construct(
         id=conversation.id,
         title=conversation.title,
         created_at=conversation.created_at,
         updated_at=conversation.updated_at,
-        last_message=conversation.messages[-1].content if conversation.messages else None,
-        llm_mode=getattr(conversation, "llm_mode", "api"),
-        embedding_model=getattr(conversation, "embedding_model", "custom")
+        last_message=conversation_messages[-1].content if conversation_messages else None,
+        llm_mode=conversation.llm_mode,
+        embedding_model=conversation.embedding_model
     )
 
+    # parent id -> replies in variant order; each group is sized once and filled by rank
     response_groups = {}
-    for msg in conversation.messages:
+    for msg, rank, count in message_rows:
         if msg.reply_to_message_id:
-            response_groups.setdefault(msg.reply_to_message_id, []).append(msg)
+            response_groups.setdefault(msg.reply_to_message_id, [None] * count)[rank - 1] = msg
 
     messages = []
-    for message in conversation.messages:
+    for message in conversation_messages:
         # Return ALL messages (including archived) so frontend can reconstruct full tree
         # Frontend will handle which branch to display based on user selection
 
         response_versions = None
         if message.role == 'user':
-            variants = sorted(
-                response_groups.get(message.id, []),
-                key=lambda resp: ((resp.version_index or 0), resp.created_at)
-            )
+            variants = response_groups.get(message.id)
             if variants:
                 response_versions = [
-                    ResponseVariant(
+                    ResponseVariant.model_construct(
                         id=variant.id,
                         version_index=variant.version_index or 1,
                         content=variant.content,
-                        sources=variant.sources_json.split("||") if variant.sources_json else [],
-                        source_chunks=(
-                            json.loads(variant.source_chunks_json)
-                            if getattr(variant, 'source_chunks_json', None)
-                            else _fallback_source_chunks(variant.sources_json.split("||") if variant.sources_json else [])
-                        ),
+                        sources=variant.sources_json or [],
+                        source_chunks=_source_chunks(variant),
                         is_active=not variant.is_archived,
                         created_at=variant.created_at,
                         prompt_content=variant.prompt_snapshot or message.content
@@ -154,46 +243,62 @@ def get_conversation(
                 ]
 
         messages.append(
-            ChatMessageResponse(
+            ChatMessageResponse.model_construct(
                 id=message.id,
                 role=message.role,
                 content=message.content,
-                sources=message.sources_json.split("||") if message.sources_json else [],
-                source_chunks=(
-                    json.loads(message.source_chunks_json)
-                    if getattr(message, 'source_chunks_json', None)
-                    else _fallback_source_chunks(message.sources_json.split("||") if message.sources_json else [])
-                ),
+                sources=message.sources_json or [],
+                source_chunks=_source_chunks(message),
                 created_at=message.created_at,
-                is_edited=message.is_edited if hasattr(message, 'is_edited') else 0,
+                is_edited=message.is_edited,
                 reply_to_message_id=message.reply_to_message_id,
                 version_index=message.version_index,
-                is_archived=bool(getattr(message, 'is_archived', 0)),
+                is_archived=bool(message.is_archived),
                 response_versions=response_versions,
-                edit_group_id=getattr(message, 'edit_group_id', None) or message.id  # Ensure edit_group_id is always set
+                edit_group_id=message.edit_group_id or message.id  # Ensure edit_group_id is always set
             )
         )
 
+    # Uploaded files' full text can run to megabytes and is only needed when a source is
+    # opened (GET .../documents/{id}/content); notes keep theirs for the notes panel
+    document_rows = db.execute(
+        select(
+            Document.id,
+            Document.filename,
+            Document.uploaded_at,
+            Document.doc_type,
+            Document.is_active,
+            case((Document.doc_type == "note", Document.content)).label("content"),
+            # EXISTS stops at the first chunk on the document_id index; no chunk row is loaded
+            select(DocumentChunk.id)
+            .where(DocumentChunk.document_id == Document.id)
+            .exists()
+            .label("has_embeddings"),
+        )
+        .where(Document.conversation_id == conversation.id)
+        .order_by(Document.id)
+    ).all()
+
     documents = []
-    for doc in conversation.documents:
-        has_embeddings = db.query(DocumentChunk).filter(DocumentChunk.document_id == doc.id).first() is not None
-        documents.append({
-            "id": doc.id,
-            "filename": doc.filename,
-            "content": doc.content,
-            "uploaded_at": doc.uploaded_at,
-            "doc_type": getattr(doc, 'doc_type', 'file'),
-            "is_active": getattr(doc, 'is_active', True),
-            "has_embeddings": has_embeddings
-        })
-
-    return ConversationDetailResponse(
+    for doc in document_rows:
+        documents.append(DocumentResponse.model_construct(
+            id=doc.id,
+            filename=doc.filename,
+            content=doc.content,
+            uploaded_at=doc.uploaded_at,
+            doc_type=doc.doc_type,
+            is_active=doc.is_active,
+            has_embeddings=doc.has_embeddings
+        ))
+
+    detail = ConversationDetailResponse.model_construct(
         conversation=summary,
         messages=messages,
         documents=documents,
-        llm_mode=getattr(conversation, "llm_mode", "api"),
-        embedding_model=getattr(conversation, "embedding_model", "custom"),
+        llm_mode=conversation.llm_mode,
+        embedding_model=conversation.embedding_model,
     )
+    return Response(content=detail.model_dump_json(), media_type="application/json", headers=cache_headers)
 
 @router.delete("/conversations/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_conversation(
@@ -211,13 +316,14 @@ def delete_conversation(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
 
     try:
-        vector_store = QdrantVectorStore(conversation_id, getattr(conversation, 'embedding_model', 'custom'))
+        vector_store = QdrantVectorStore(conversation_id, conversation.embedding_model)
         vector_store.delete_by_conversation()
     except Exception:
         pass
 
     db.delete(conversation)
     db.commit()
+    invalidate_hybrid_rag_processor(conversation_id)
 
 
 @router.delete("/conversations/{conversation_id}/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -228,38 +334,43 @@ def delete_document(
     current_user = Depends(get_current_user)
 ):
     """Delete a document and its chunks from a conversation"""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-
-    document = (
-        db.query(Document)
-        .filter(Document.id == document_id, Document.conversation_id == conversation_id)
-        .first()
-    )
-
-    if not document:
+    owned = _get_owned_document(db, conversation_id, document_id, current_user.id)
+    if not owned:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    document, embedding_model = owned
 
     try:
-        vector_store = QdrantVectorStore(conversation_id, getattr(conversation, 'embedding_model', 'custom'))
+        vector_store = QdrantVectorStore(conversation_id, embedding_model)
         vector_store.delete_by_document(document_id)
     except Exception:
         pass
 
-    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
     
     # Delete the document
     db.delete(document)
+    _bump_conversation_version(db, conversation_id)
     db.commit()
+    invalidate_hybrid_rag_processor(conversation_id)
 
 
-@router.post("/conversations/{conversation_id}/notes")
+@router.get("/conversations/{conversation_id}/documents/{document_id}/content")
+def get_document_content(
+    conversation_id: int,
+    document_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Return a document's full text, which the conversation payload leaves out for files"""
+    owned = _get_owned_document(db, conversation_id, document_id, current_user.id)
+    if not owned:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    document = owned[0]
+
+    return {"id": document.id, "content": document.content}
+
+
+@router.post("/conversations/{conversation_id}/notes", response_model=NoteResponse, response_model_exclude_unset=True)
 def create_note(
     conversation_id: int,
     note: NoteCreate,
@@ -284,21 +395,15 @@ def create_note(
         is_active=True
     )
     db.add(document)
+    _bump_conversation_version(db, conversation_id)
     db.flush()
     db.commit()
     db.refresh(document)
 
-    return {
-        "id": document.id,
-        "filename": document.filename,
-        "content": document.content,
-        "doc_type": document.doc_type,
-        "is_active": document.is_active,
-        "uploaded_at": document.uploaded_at
-    }
+    return document
 
 
-@router.put("/conversations/{conversation_id}/notes/{note_id}")
+@router.put("/conversations/{conversation_id}/notes/{note_id}", response_model=NoteResponse, response_model_exclude_unset=True)
 def update_note(
     conversation_id: int,
     note_id: int,
@@ -307,43 +412,24 @@ def update_note(
     current_user = Depends(get_current_user)
 ):
     """Update a note"""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-
-    document = (
-        db.query(Document)
-        .filter(Document.id == note_id, Document.conversation_id == conversation_id, Document.doc_type == "note")
-        .first()
-    )
-
-    if not document:
+    owned = _get_owned_document(db, conversation_id, note_id, current_user.id, doc_type="note")
+    if not owned:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+    document = owned[0]
 
     if note.title is not None:
         document.filename = note.title
     if note.content is not None:
         document.content = note.content
 
+    _bump_conversation_version(db, conversation_id)
     db.commit()
     db.refresh(document)
 
-    return {
-        "id": document.id,
-        "filename": document.filename,
-        "content": document.content,
-        "doc_type": document.doc_type,
-        "is_active": document.is_active,
-        "uploaded_at": document.uploaded_at
-    }
+    return document
 
 
-@router.post("/conversations/{conversation_id}/notes/{note_id}/convert")
+@router.post("/conversations/{conversation_id}/notes/{note_id}/convert", response_model=NoteResponse, response_model_exclude_unset=True)
 def convert_note_to_source(
     conversation_id: int,
     note_id: int,
@@ -353,24 +439,11 @@ def convert_note_to_source(
     """Convert a note to a searchable source by creating embeddings.
     If already converted, updates the existing chunks with new content."""
     try:
-        conversation = (
-            db.query(Conversation)
-            .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-            .first()
-        )
-
-        if not conversation:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-
-        # Get the note document
-        note_doc = (
-            db.query(Document)
-            .filter(Document.id == note_id, Document.conversation_id == conversation_id, Document.doc_type == "note")
-            .first()
-        )
-
-        if not note_doc:
+        # The note, checked against the user's conversation in the same query
+        owned = _get_owned_document(db, conversation_id, note_id, current_user.id, doc_type="note")
+        if not owned:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Note with ID {note_id} not found")
+        note_doc, embedding_model = owned
 
         if not note_doc.content or not note_doc.content.strip():
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Note has no content to convert")
@@ -382,61 +455,67 @@ def convert_note_to_source(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not create chunks from note content")
         
         # Delete any existing chunks for this note (for re-conversion)
-        db.query(DocumentChunk).filter(DocumentChunk.document_id == note_id).delete()
+        db.query(DocumentChunk).filter(DocumentChunk.document_id == note_id).delete(synchronize_session=False)
         
         try:
-            vector_store = QdrantVectorStore(conversation_id, getattr(conversation, 'embedding_model', 'custom'))
+            vector_store = QdrantVectorStore(conversation_id, embedding_model)
             vector_store.delete_by_document(note_id)
         except Exception:
             pass
         
-        # Create new chunks in SQLite
-        for i, chunk in enumerate(chunks):
-            metadata = {
-                "source": note_doc.filename,
-                "chunk_index": i,
-                "doc_type": "note"
-            }
-            db_chunk = DocumentChunk(
-                conversation_id=conversation_id,
-                document_id=note_doc.id,
-                chunk_index=i,
-                content=chunk,
-                metadata_json=json.dumps(metadata)
-            )
-            db.add(db_chunk)
+        # Only chunk_index varies in the metadata, so the JSON is encoded once around it;
+        # the output matches json.dumps({"source": ..., "chunk_index": i, "doc_type": "note"})
+        metadata_head = '{"source": ' + json.dumps(note_doc.filename) + ', "chunk_index": '
+        metadata_tail = ', "doc_type": "note"}'
+
+        # Create new chunks in SQLite with one executemany INSERT, bypassing the unit of work
+        db.execute(
+            insert(DocumentChunk),
+            [
+                {
+                    "conversation_id": conversation_id,
+                    "document_id": note_doc.id,
+                    "chunk_index": i,
+                    "content": chunk,
+                    "metadata_json": f"{metadata_head}{i}{metadata_tail}",
+                }
+                for i, chunk in enumerate(chunks)
+            ],
+        )
         
         embeddings_success = False
         try:
             text_data = {note_doc.filename: note_doc.content}
             source_to_doc_id = {note_doc.filename: note_doc.id}
-            vector_store = QdrantVectorStore(conversation_id, getattr(conversation, 'embedding_model', 'custom'))
+            vector_store = QdrantVectorStore(conversation_id, embedding_model)
             vector_store.add_documents(text_data, source_to_doc_id)
             embeddings_success = True
         except Exception as e:
             logger.warning(f"Failed to add note vectors: {e}")
         
         note_doc.has_embeddings = embeddings_success
+        _bump_conversation_version(db, conversation_id)
         
         db.commit()
+        invalidate_hybrid_rag_processor(conversation_id)
         
-        return {
-            "message": "Note converted to source",
-            "id": note_doc.id,
-            "filename": note_doc.filename,
-            "content": note_doc.content,
-            "doc_type": "note",
-            "is_active": True,
-            "has_embeddings": True,
-            "chunks_created": len(chunks)
-        }
+        return NoteResponse(
+            message="Note converted to source",
+            id=note_doc.id,
+            filename=note_doc.filename,
+            content=note_doc.content,
+            doc_type="note",
+            is_active=True,
+            has_embeddings=True,
+            chunks_created=len(chunks)
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error converting note: {str(e)}")
 
 
-@router.post("/conversations/{conversation_id}/notes/{note_id}/unconvert")
+@router.post("/conversations/{conversation_id}/notes/{note_id}/unconvert", response_model=NoteResponse, response_model_exclude_unset=True)
 def unconvert_note_from_source(
     conversation_id: int,
     note_id: int,
@@ -446,47 +525,36 @@ def unconvert_note_from_source(
     """Remove embeddings from a note, converting it back to a regular note.
     This keeps the note but removes it from the searchable sources."""
     try:
-        conversation = (
-            db.query(Conversation)
-            .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-            .first()
-        )
-
-        if not conversation:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-
-        # Get the note document
-        note_doc = (
-            db.query(Document)
-            .filter(Document.id == note_id, Document.conversation_id == conversation_id, Document.doc_type == "note")
-            .first()
-        )
-
-        if not note_doc:
+        # The note, checked against the user's conversation in the same query
+        owned = _get_owned_document(db, conversation_id, note_id, current_user.id, doc_type="note")
+        if not owned:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Note with ID {note_id} not found")
+        note_doc, embedding_model = owned
 
         # Delete all chunks for this note
-        deleted_count = db.query(DocumentChunk).filter(DocumentChunk.document_id == note_id).delete()
+        deleted_count = db.query(DocumentChunk).filter(DocumentChunk.document_id == note_id).delete(synchronize_session=False)
         
         # Also delete vectors from Qdrant
         try:
-            vector_store = QdrantVectorStore(conversation_id, getattr(conversation, 'embedding_model', 'custom'))
+            vector_store = QdrantVectorStore(conversation_id, embedding_model)
             vector_store.delete_by_document(note_id)
         except Exception:
             pass
         
         # Mark the note as no longer having embeddings
         note_doc.has_embeddings = False
+        _bump_conversation_version(db, conversation_id)
         
         db.commit()
+        invalidate_hybrid_rag_processor(conversation_id)
         
-        return {
-            "message": "Note unconverted from source",
-            "id": note_doc.id,
-            "filename": note_doc.filename,
-            "has_embeddings": False,
-            "chunks_deleted": deleted_count
-        }
+        return NoteResponse(
+            message="Note unconverted from source",
+            id=note_doc.id,
+            filename=note_doc.filename,
+            has_embeddings=False,
+            chunks_deleted=deleted_count
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -502,25 +570,14 @@ def toggle_document(
     current_user = Depends(get_current_user)
 ):
     """Toggle document active status for queries"""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-
-    document = (
-        db.query(Document)
-        .filter(Document.id == document_id, Document.conversation_id == conversation_id)
-        .first()
-    )
-
-    if not document:
+    owned = _get_owned_document(db, conversation_id, document_id, current_user.id)
+    if not owned:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    document = owned[0]
 
     document.is_active = toggle.is_active
+    _bump_conversation_version(db, conversation_id)
     db.commit()
+    invalidate_hybrid_rag_processor(conversation_id)
 
     return {"id": document.id, "is_active": document.is_active}
\ No newline at end of file
@@ -1,11 +1,15 @@
+import asyncio
 import io
+import json
 import re
 import urllib.parse
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.colors import HexColor
 
@@ -16,77 +20,113 @@ from ..models.db_models import Conversation, ChatMessage
 router = APIRouter()
 
 
+# Characters not allowed in filenames, deleted in one str.translate pass
+_FILENAME_FORBIDDEN = str.maketrans("", "", '\\/*?:"<>|')
+
+
 def _safe_filename(title: str) -> str:
     """Sanitise a conversation title for use as a filename."""
-    name = re.sub(r'[\\/*?:"<>|]', "", title or "chat").strip() or "chat"
+    name = (title or "chat").translate(_FILENAME_FORBIDDEN).strip() or "chat"
     return urllib.parse.quote(name, safe=" ._-")
 
 
-@router.post("/download")
-async def download_chat(
-    download_request: DownloadRequest,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == download_request.conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
+# Exports are sent in blocks of this size; iterating a StringIO/BytesIO directly
+# would send one line per chunk
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# The generators are async: the content is already in memory, and Starlette would
+# hand every block of a sync iterator to the threadpool
+async def _iter_text(content: str):
+    """Yield an exported text document as UTF-8 in fixed-size blocks."""
+    for start in range(0, len(content), _STREAM_CHUNK_SIZE):
+        yield content[start:start + _STREAM_CHUNK_SIZE].encode("utf-8")
 
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    chat_messages = (
-        db.query(ChatMessage)
-        .filter(
-            ChatMessage.conversation_id == conversation.id,
-            ChatMessage.is_archived == False
+async def _iter_buffer(buffer: io.BytesIO):
+    """Yield a rendered file in fixed-size blocks, straight from its buffer."""
+    with buffer:
+        while block := buffer.read(_STREAM_CHUNK_SIZE):
+            yield block
+
+
+def _load_chat_history(db: Session, conversation_id: int, user_id: int):
+    """Load an owned conversation's title and visible messages; returns (title, chat_history)."""
+    # Ownership check and messages in one round trip: the outer join keeps the
+    # conversation row even when it has no visible messages
+    rows = db.execute(
+        select(
+            Conversation.title,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.sources_json,
+            ChatMessage.created_at,
         )
-        .order_by(ChatMessage.created_at.asc())
-        .all()
-    )
+        .select_from(Conversation)
+        .outerjoin(
+            ChatMessage,
+            (ChatMessage.conversation_id == Conversation.id) & (ChatMessage.is_archived == False),
+        )
+        .where(Conversation.id == conversation_id, Conversation.user_id == user_id)
+        .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+    ).all()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    if not chat_messages:
+    if rows[0].role is None:
         raise HTTPException(status_code=400, detail="No chat history to download")
 
-    chat_history = []
-    for message in chat_messages:
-        entry = {
-            "role": message.role,
-            "content": message.content,
-            "sources": message.sources_json.split("||") if message.sources_json else [],
-            "timestamp": message.created_at,
+    chat_history = [
+        {
+            "role": row.role,
+            "content": row.content,
+            "sources": row.sources_json or [],
+            "timestamp": row.created_at,
         }
-        chat_history.append(entry)
+        for row in rows
+    ]
+
+    return rows[0].title or "Chat", chat_history
+
+
+@router.post("/download")
+async def download_chat(
+    download_request: DownloadRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    if download_request.format not in ("txt", "pdf", "json"):
+        raise HTTPException(status_code=400, detail="Unsupported format")
 
-    conv_title = conversation.title or "Chat"
+    # The session is synchronous and rendering is CPU-bound; both run in a worker
+    # thread so other requests keep being served meanwhile
+    conv_title, chat_history = await asyncio.to_thread(
+        _load_chat_history, db, download_request.conversation_id, current_user.id
+    )
     safe_name = _safe_filename(conv_title)
 
     if download_request.format == "txt":
-        content = _generate_txt_content(chat_history, conv_title)
+        content = await asyncio.to_thread(_generate_txt_content, chat_history, conv_title)
         return StreamingResponse(
-            io.StringIO(content),
+            _iter_text(content),
             media_type="text/plain",
             headers={"Content-Disposition": f'attachment; filename="{safe_name}.txt"'}
         )
     elif download_request.format == "pdf":
-        pdf_content = _generate_pdf_content(chat_history, conv_title)
+        pdf_buffer = await asyncio.to_thread(_generate_pdf_content, chat_history, conv_title)
         return StreamingResponse(
-            io.BytesIO(pdf_content),
+            _iter_buffer(pdf_buffer),
             media_type="application/pdf",
             headers={"Content-Disposition": f'attachment; filename="{safe_name}.pdf"'}
         )
-    elif download_request.format == "json":
-        import json
-        json_data = _generate_json_content(chat_history, conv_title)
+    else:
+        content = await asyncio.to_thread(_generate_json_text, chat_history, conv_title)
         return StreamingResponse(
-            io.StringIO(json.dumps(json_data, indent=2, default=str)),
+            _iter_text(content),
             media_type="application/json",
             headers={"Content-Disposition": f'attachment; filename="{safe_name}.json"'}
         )
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported format")
 
 
 # ── JSON generation ─────────────────────────────────────────────────
@@ -110,6 +150,10 @@ def _generate_json_content(chat_history: list, title: str) -> dict:
     }
 
 
+def _generate_json_text(chat_history: list, title: str) -> str:
+    return json.dumps(_generate_json_content(chat_history, title), indent=2, default=str)
+
+
 # ── TXT generation ──────────────────────────────────────────────────
 
 def _format_ts(ts) -> str:
@@ -120,30 +164,35 @@ def _format_ts(ts) -> str:
     return str(ts)
 
 
+_TXT_RULE = "=" * 60 + "\n"
+_TXT_DIVIDER = "\n" + "-" * 50 + "\n\n"
+
+
 def _generate_txt_content(chat_history: list, title: str) -> str:
-    lines: list[str] = []
-    lines.append(f"  {title}")
-    lines.append("=" * 60)
-    lines.append(f"  Exported on {datetime.now().strftime('%b %d, %Y at %I:%M %p')}")
-    lines.append(f"  Total messages: {len(chat_history)}")
-    lines.append("=" * 60)
-    lines.append("")
+    # Pieces go straight into one buffer instead of a list of lines joined at the end
+    buf = io.StringIO()
+    write = buf.write
+    write(f"  {title}\n")
+    write(_TXT_RULE)
+    write(f"  Exported on {datetime.now().strftime('%b %d, %Y at %I:%M %p')}\n")
+    write(f"  Total messages: {len(chat_history)}\n")
+    write(_TXT_RULE)
+    write("\n")
 
     for entry in chat_history:
-        role = entry["role"]
-        label = "You" if role == "user" else "DocTalk"
+        write("[You]" if entry["role"] == "user" else "[DocTalk]")
         ts = _format_ts(entry.get("timestamp"))
-        header = f"[{label}]" + (f"  ({ts})" if ts else "")
-        lines.append(header)
-        lines.append(entry["content"])
+        if ts:
+            write(f"  ({ts})")
+        write("\n")
+        write(entry["content"])
+        write("\n")
         if entry.get("sources"):
-            lines.append(f"  Sources: {', '.join(entry['sources'])}")
-        lines.append("")
-        lines.append("-" * 50)
-        lines.append("")
+            write(f"  Sources: {', '.join(entry['sources'])}\n")
+        write(_TXT_DIVIDER)
 
-    lines.append("— End of conversation —")
-    return "\n".join(lines)
+    write("— End of conversation —")
+    return buf.getvalue()
 
 
 # ── PDF generation ──────────────────────────────────────────────────
@@ -172,9 +221,25 @@ _H2_SIZE       = 11.5
 _BULLET_INDENT = 14
 
 
-def _generate_pdf_content(chat_history: list, title: str) -> bytes:
-    from reportlab.pdfbase.pdfmetrics import stringWidth
+# font -> {char: width at 1000pt}. The export fonts have no kerning, so a string's width is
+# the sum of its glyphs'; each glyph is measured once per process instead of per word
+_GLYPH_WIDTHS: dict[str, dict[str, float]] = {}
 
+
+def _text_width(txt: str, font: str, size: float) -> float:
+    widths = _GLYPH_WIDTHS.get(font)
+    if widths is None:
+        widths = _GLYPH_WIDTHS[font] = {}
+    total = 0.0
+    for ch in txt:
+        w = widths.get(ch)
+        if w is None:
+            w = widths[ch] = stringWidth(ch, font, 1000)
+        total += w
+    return total * size / 1000
+
+
+def _generate_pdf_content(chat_history: list, title: str) -> io.BytesIO:
     buffer = io.BytesIO()
     p = canvas.Canvas(buffer, pagesize=letter)
     W, H = letter
@@ -209,37 +274,41 @@ def _generate_pdf_content(chat_history: list, title: str) -> bytes:
         if y - need < _MB:
             _new_page()
 
-    def _tw(txt: str, font: str, size: float) -> float:
-        return stringWidth(txt, font, size)
+    _tw = _text_width
 
     def _wrap(text: str, font: str, size: float, max_w: float) -> list[str]:
         if not text:
             return [""]
-        words = text.split()
+        # Glyph widths add up, so each word is measured once and line widths are
+        # running sums instead of re-measuring the whole line per word. The limit
+        # absorbs float drift, so a line that fits exactly still fits
+        max_w += 1e-6
+        space_w = _tw(" ", font, size)
         lines: list[str] = []
-        cur = ""
-        for word in words:
-            test = cur + (" " if cur else "") + word
-            if _tw(test, font, size) <= max_w:
-                cur = test
-            else:
-                if cur:
-                    lines.append(cur)
-                if _tw(word, font, size) <= max_w:
-                    cur = word
-                else:
-                    while _tw(word, font, size) > max_w:
-                        for i in range(len(word), 0, -1):
-                            if _tw(word[:i], font, size) <= max_w:
-                                lines.append(word[:i])
-                                word = word[i:]
-                                break
-                        else:
-                            lines.append(word[0])
-                            word = word[1:]
-                    cur = word
+        cur: list[str] = []
+        cur_w = 0.0
+        for word in text.split():
+            word_w = _tw(word, font, size)
+            if cur and cur_w + space_w + word_w <= max_w:
+                cur.append(word)
+                cur_w += space_w + word_w
+                continue
+            if cur:
+                lines.append(" ".join(cur))
+            if word_w <= max_w:
+                cur, cur_w = [word], word_w
+                continue
+            # Break an over-long word in one forward pass, at least one character per line
+            start, piece_w = 0, 0.0
+            for i, ch in enumerate(word):
+                ch_w = _tw(ch, font, size)
+                if i > start and piece_w + ch_w > max_w:
+                    lines.append(word[start:i])
+                    start, piece_w = i, 0.0
+                piece_w += ch_w
+            cur, cur_w = [word[start:]], piece_w
         if cur:
-            lines.append(cur)
+            lines.append(" ".join(cur))
         return lines or [""]
 
     # title
@@ -264,72 +333,72 @@ def _generate_pdf_content(chat_history: list, title: str) -> bytes:
     content_left = _ML + 4
     content_max  = usable - 8
 
+    # Per-line layout of the current message, one list per attribute
+    texts: list[str] = []
+    fonts: list = []
+    leadings: list[float] = []
+    indents: list[float] = []
+
+    def _add_lines(wrapped: list[str], font: tuple, leading: float, indent: float = 0):
+        texts.extend(wrapped)
+        fonts.extend([font] * len(wrapped))
+        leadings.extend([leading] * len(wrapped))
+        indents.extend([indent] * len(wrapped))
+
+    def _add_spacer(leading: float):
+        texts.append("")
+        fonts.append(None)
+        leadings.append(leading)
+        indents.append(0)
+
     for entry in chat_history:
         is_user = entry["role"] == "user"
         label = "You:" if is_user else "DocTalk:"
         ts = _format_ts(entry.get("timestamp"))
 
-        segments = _parse_markdown(entry["content"])
-
-        rendered_lines: list[dict] = []
-        for seg in segments:
+        # Laid out once into parallel columns that are reused for every message: no
+        # per-line dict, and the height is a sum over one list
+        del texts[:], fonts[:], leadings[:], indents[:]
+        for seg in _parse_markdown(entry["content"]):
             kind = seg["type"]
             text = seg.get("text", "")
 
             if kind == "heading1":
-                for wl in _wrap(text, _BODY_BOLD, _H1_SIZE, content_max):
-                    rendered_lines.append({"text": wl, "font": _BODY_BOLD, "size": _H1_SIZE, "leading": 18, "indent": 0})
-                rendered_lines.append({"text": "", "font": _BODY_FONT, "size": 4, "leading": 4, "indent": 0})
+                _add_lines(_wrap(text, _BODY_BOLD, _H1_SIZE, content_max), (_BODY_BOLD, _H1_SIZE), 18)
+                _add_spacer(4)
             elif kind == "heading2":
-                for wl in _wrap(text, _BODY_BOLD, _H2_SIZE, content_max):
-                    rendered_lines.append({"text": wl, "font": _BODY_BOLD, "size": _H2_SIZE, "leading": 16, "indent": 0})
-                rendered_lines.append({"text": "", "font": _BODY_FONT, "size": 3, "leading": 3, "indent": 0})
-            elif kind == "bullet":
-                first = True
-                for wl in _wrap(text, _BODY_FONT, _BODY_SIZE, content_max - _BULLET_INDENT):
-                    prefix = "•  " if first else ""
-                    rendered_lines.append({"text": prefix + wl, "font": _BODY_FONT, "size": _BODY_SIZE,
-                                           "leading": _BODY_LEADING, "indent": _BULLET_INDENT if not first else 0})
-                    first = False
-            elif kind == "numbered":
-                num = seg.get("num", "1")
-                first = True
-                for wl in _wrap(text, _BODY_FONT, _BODY_SIZE, content_max - _BULLET_INDENT):
-                    prefix = f"{num}.  " if first else ""
-                    rendered_lines.append({"text": prefix + wl, "font": _BODY_FONT, "size": _BODY_SIZE,
-                                           "leading": _BODY_LEADING, "indent": _BULLET_INDENT if not first else 0})
-                    first = False
+                _add_lines(_wrap(text, _BODY_BOLD, _H2_SIZE, content_max), (_BODY_BOLD, _H2_SIZE), 16)
+                _add_spacer(3)
+            elif kind in ("bullet", "numbered"):
+                first = len(texts)
+                _add_lines(
+                    _wrap(text, _BODY_FONT, _BODY_SIZE, content_max - _BULLET_INDENT),
+                    (_BODY_FONT, _BODY_SIZE), _BODY_LEADING, _BULLET_INDENT,
+                )
+                texts[first] = ("•  " if kind == "bullet" else f"{seg.get('num', '1')}.  ") + texts[first]
+                indents[first] = 0
             elif kind == "code":
                 for cl in text.split("\n"):
-                    for wl in _wrap(cl or " ", "Courier", _CODE_SIZE, content_max - 12):
-                        rendered_lines.append({"text": wl, "font": "Courier", "size": _CODE_SIZE,
-                                               "leading": _CODE_LEADING, "indent": 8})
-                rendered_lines.append({"text": "", "font": _BODY_FONT, "size": 4, "leading": 4, "indent": 0})
+                    _add_lines(_wrap(cl or " ", "Courier", _CODE_SIZE, content_max - 12), ("Courier", _CODE_SIZE), _CODE_LEADING, 8)
+                _add_spacer(4)
             elif kind == "bold":
-                for wl in _wrap(text, _BODY_BOLD, _BODY_SIZE, content_max):
-                    rendered_lines.append({"text": wl, "font": _BODY_BOLD, "size": _BODY_SIZE,
-                                           "leading": _BODY_LEADING, "indent": 0})
+                _add_lines(_wrap(text, _BODY_BOLD, _BODY_SIZE, content_max), (_BODY_BOLD, _BODY_SIZE), _BODY_LEADING)
             elif kind == "italic":
-                for wl in _wrap(text, _BODY_ITALIC, _BODY_SIZE, content_max):
-                    rendered_lines.append({"text": wl, "font": _BODY_ITALIC, "size": _BODY_SIZE,
-                                           "leading": _BODY_LEADING, "indent": 0})
+                _add_lines(_wrap(text, _BODY_ITALIC, _BODY_SIZE, content_max), (_BODY_ITALIC, _BODY_SIZE), _BODY_LEADING)
             elif kind == "blank":
-                rendered_lines.append({"text": "", "font": _BODY_FONT, "size": 5, "leading": 7, "indent": 0})
+                _add_spacer(7)
             else:
-                for wl in _wrap(text, _BODY_FONT, _BODY_SIZE, content_max):
-                    rendered_lines.append({"text": wl, "font": _BODY_FONT, "size": _BODY_SIZE,
-                                           "leading": _BODY_LEADING, "indent": 0})
+                _add_lines(_wrap(text, _BODY_FONT, _BODY_SIZE, content_max), (_BODY_FONT, _BODY_SIZE), _BODY_LEADING)
 
-        source_rendered: list[dict] = []
+        content_count = len(texts)
+        content_h = sum(leadings)
         if entry.get("sources"):
             src_text = "Sources: " + ", ".join(entry["sources"])
-            for wl in _wrap(src_text, _BODY_ITALIC, _SMALL_SIZE, content_max):
-                source_rendered.append({"text": wl, "font": _BODY_ITALIC, "size": _SMALL_SIZE,
-                                        "leading": _SMALL_LEADING, "indent": 0})
+            _add_lines(_wrap(src_text, _BODY_ITALIC, _SMALL_SIZE, content_max), (_BODY_ITALIC, _SMALL_SIZE), _SMALL_LEADING)
+        has_sources = len(texts) > content_count
 
         header_h = 20
-        content_h = sum(rl["leading"] for rl in rendered_lines)
-        source_h  = (sum(sl["leading"] for sl in source_rendered) + 4) if source_rendered else 0
+        source_h  = (sum(leadings[content_count:]) + 4) if has_sources else 0
         total_h = header_h + content_h + source_h + 10
 
         _ensure(min(total_h, 60))
@@ -343,20 +412,34 @@ def _generate_pdf_content(chat_history: list, title: str) -> bytes:
             p.drawRightString(W - _MR, y, ts)
         y -= header_h
 
-        all_lines = rendered_lines + source_rendered
-        for li, rl in enumerate(all_lines):
-            if li == len(rendered_lines) and source_rendered:
+        # One text object per page run instead of one per line (each drawString opens
+        # its own), with font and colour operators emitted only when they change
+        text_obj = p.beginText()
+        cur_font = cur_color = None
+        for li, line in enumerate(texts):
+            leading = leadings[li]
+            if li == content_count:
                 y -= 4
 
-            if y - rl["leading"] < _MB:
+            if y - leading < _MB:
+                p.drawText(text_obj)
                 _new_page()
-
-            if rl["text"]:
-                p.setFillColor(_GRAY if li >= len(rendered_lines) else _BLACK)
-                p.setFont(rl["font"], rl["size"])
-                p.drawString(content_left + rl["indent"], y, rl["text"])
-
-            y -= rl["leading"]
+                text_obj = p.beginText()
+                cur_font = cur_color = None
+
+            if line:
+                color = _GRAY if li >= content_count else _BLACK
+                if color is not cur_color:
+                    text_obj.setFillColor(color)
+                    cur_color = color
+                if fonts[li] != cur_font:
+                    cur_font = fonts[li]
+                    text_obj.setFont(*cur_font)
+                text_obj.setTextOrigin(content_left + indents[li], y)
+                text_obj.textOut(line)
+
+            y -= leading
+        p.drawText(text_obj)
 
         y -= 6
 
@@ -372,8 +455,24 @@ def _generate_pdf_content(chat_history: list, title: str) -> bytes:
 
     _page_footer()
     p.save()
+    # Hand back the buffer itself; getvalue() would copy the whole document
     buffer.seek(0)
-    return buffer.getvalue()
+    return buffer
+
+
+# Block-level markdown line kinds; the last group of each alternative is the segment type.
+# A bullet can't open with "**" so bold-only lines aren't taken for bullets
+_LINE_RE = re.compile(
+    r'## (?P<heading2>.*)'
+    r'|# (?P<heading1>.*)'
+    r'|(?!\*\*)[-*]\s+(?P<bullet>.+)'
+    r'|(?P<num>\d+)[.)]\s+(?P<numbered>.+)'
+    r'|\*\*(?P<bold>.+?)\*\*'
+    r'|\*(?P<italic>.+?)\*'
+)
+_INLINE_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+_INLINE_ITALIC_RE = re.compile(r'\*(.+?)\*')
+_INLINE_CODE_RE = re.compile(r'`(.+?)`')
 
 
 def _parse_markdown(text: str) -> list[dict]:
@@ -405,36 +504,22 @@ def _parse_markdown(text: str) -> list[dict]:
             segments.append({"type": "blank"})
             continue
 
-        if stripped.startswith("## "):
-            segments.append({"type": "heading2", "text": stripped[3:]})
-            continue
-        if stripped.startswith("# "):
-            segments.append({"type": "heading1", "text": stripped[2:]})
-            continue
-
-        bullet_match = re.match(r'^[-*]\s+(.+)$', stripped)
-        if bullet_match and not stripped.startswith("**"):
-            segments.append({"type": "bullet", "text": bullet_match.group(1)})
-            continue
-
-        num_match = re.match(r'^(\d+)[.)]\s+(.+)$', stripped)
-        if num_match:
-            segments.append({"type": "numbered", "text": num_match.group(2), "num": num_match.group(1)})
-            continue
-
-        bold_match = re.match(r'^\*\*(.+?)\*\*$', stripped)
-        if bold_match:
-            segments.append({"type": "bold", "text": bold_match.group(1)})
-            continue
-
-        italic_match = re.match(r'^\*(.+?)\*$', stripped)
-        if italic_match:
-            segments.append({"type": "italic", "text": italic_match.group(1)})
+        # One anchored pass picks the line's kind; alternatives are tried in the
+        # order the old per-pattern checks ran, and each names its segment type
+        match = _LINE_RE.fullmatch(stripped)
+        if match:
+            kind = match.lastgroup
+            segment = {"type": kind, "text": match.group(kind)}
+            if kind == "numbered":
+                segment["num"] = match.group("num")
+            segments.append(segment)
             continue
 
-        cleaned = re.sub(r'\*\*(.+?)\*\*', r'\1', stripped)
-        cleaned = re.sub(r'\*(.+?)\*', r'\1', cleaned)
-        cleaned = re.sub(r'`(.+?)`', r'\1', cleaned)
+        cleaned = stripped
+        if "*" in cleaned:
+            cleaned = _INLINE_ITALIC_RE.sub(r'\1', _INLINE_BOLD_RE.sub(r'\1', cleaned))
+        if "`" in cleaned:
+            cleaned = _INLINE_CODE_RE.sub(r'\1', cleaned)
         segments.append({"type": "text", "text": cleaned})
 
     if in_code and code_buf:
@@ -1,11 +1,13 @@
+import asyncio
 from typing import List
 import json
 import re
 from fastapi import APIRouter, HTTPException, Depends, status
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 
-from ..dependencies import get_db, get_current_user
-from ..models.db_models import Conversation, DocumentChunk, Flashcard
+from ..dependencies import get_db, get_owned_conversation
+from ..models.db_models import Document, DocumentChunk, Flashcard
 from ..models.schemas import FlashcardResponse, FlashcardListResponse, FlashcardGenerateRequest
 from ..utils.llm_router import get_llm_client
 from ..utils.ollama_client import LocalModeLock
@@ -147,18 +149,9 @@ def parse_flashcards_response(response_text: str) -> List[dict]:
 def get_flashcards(
     conversation_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    conversation = Depends(get_owned_conversation)
 ):
     """Get all flashcards for a conversation."""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-    
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    
     flashcards = (
         db.query(Flashcard)
         .filter(Flashcard.conversation_id == conversation_id)
@@ -169,43 +162,80 @@ def get_flashcards(
     return FlashcardListResponse(flashcards=flashcards)
 
 
-@router.post("/conversations/{conversation_id}/flashcards/generate", response_model=FlashcardListResponse)
-async def generate_flashcards(
-    conversation_id: int,
-    request: FlashcardGenerateRequest,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """Generate flashcards from conversation documents using LLM."""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-    
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    
-    # Get all chunks to cover entire document
-    chunks = (
-        db.query(DocumentChunk)
-        .filter(DocumentChunk.conversation_id == conversation_id)
+def _load_generation_inputs(db: Session, conversation_id: int):
+    """Load what flashcard generation reads; returns (all_chunks, existing_questions)."""
+    # Get all chunks to cover entire document. Only the text and source name are used, so
+    # fetch those two columns with the filename joined in rather than loading each
+    # chunk's row and then its document one query at a time
+    chunk_rows = db.execute(
+        select(DocumentChunk.content, Document.filename)
+        .outerjoin(Document, DocumentChunk.document_id == Document.id)
+        .where(DocumentChunk.conversation_id == conversation_id)
         .order_by(DocumentChunk.chunk_index.asc())
-        .all()
-    )
+    ).all()
     
-    if not chunks:
+    if not chunk_rows:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No documents found in this conversation to generate flashcards from"
         )
     
-    all_chunks = [{"content": chunk.content, "metadata": {"source": chunk.document.filename if chunk.document else "Unknown"}} for chunk in chunks]
+    all_chunks = [{"content": row.content, "metadata": {"source": row.filename if row.filename is not None else "Unknown"}} for row in chunk_rows]
     
-    existing_flashcards = db.query(Flashcard).filter(
-        Flashcard.conversation_id == conversation_id
-    ).all()
-    existing_questions = [fc.front for fc in existing_flashcards]
+    existing_questions = db.execute(
+        select(Flashcard.front).where(Flashcard.conversation_id == conversation_id)
+    ).scalars().all()
+    
+    return all_chunks, existing_questions
+
+
+def _save_flashcards(db: Session, conversation_id: int, flashcard_data: List[dict]) -> List[Flashcard]:
+    """Append generated cards after the existing ones and return every card in order."""
+    # Append after the highest order_index: an index seek, and unlike a row count it
+    # can't collide with existing cards once some have been deleted
+    max_order = db.execute(
+        select(func.coalesce(func.max(Flashcard.order_index), -1) + 1)
+        .where(Flashcard.conversation_id == conversation_id)
+    ).scalar()
+    
+    # One executemany INSERT; the cards are read back below with the rest, so
+    # there is no per-card object or refresh
+    db.execute(
+        insert(Flashcard),
+        [
+            {
+                "conversation_id": conversation_id,
+                "front": fc.get("front", ""),
+                "back": fc.get("back", ""),
+                "order_index": max_order + i,
+            }
+            for i, fc in enumerate(flashcard_data)
+        ],
+    )
+    db.commit()
+    
+    # Return ALL flashcards for the conversation
+    return (
+        db.query(Flashcard)
+        .filter(Flashcard.conversation_id == conversation_id)
+        .order_by(Flashcard.order_index.asc())
+        .all()
+    )
+
+
+@router.post("/conversations/{conversation_id}/flashcards/generate", response_model=FlashcardListResponse)
+async def generate_flashcards(
+    conversation_id: int,
+    request: FlashcardGenerateRequest,
+    db: Session = Depends(get_db),
+    conversation = Depends(get_owned_conversation)
+):
+    """Generate flashcards from conversation documents using LLM."""
+    # The session is synchronous; its queries run in a worker thread so the event loop
+    # keeps serving other requests, including while this one waits on the LLM
+    all_chunks, existing_questions = await asyncio.to_thread(
+        _load_generation_inputs, db, conversation_id
+    )
     
     is_local = (conversation.llm_mode or "api") == "local"
     target_count = 15
@@ -238,34 +268,7 @@ async def generate_flashcards(
             detail="Failed to parse flashcard response from LLM"
         )
     
-    # Get current max order_index to append new cards
-    max_order = db.query(Flashcard).filter(
-        Flashcard.conversation_id == conversation_id
-    ).count()
-    
-    new_flashcards = []
-    for i, fc in enumerate(flashcard_data):
-        flashcard = Flashcard(
-            conversation_id=conversation_id,
-            front=fc.get("front", ""),
-            back=fc.get("back", ""),
-            order_index=max_order + i
-        )
-        db.add(flashcard)
-        new_flashcards.append(flashcard)
-    
-    db.commit()
-    
-    for fc in new_flashcards:
-        db.refresh(fc)
-    
-    # Return ALL flashcards for the conversation
-    all_flashcards = (
-        db.query(Flashcard)
-        .filter(Flashcard.conversation_id == conversation_id)
-        .order_by(Flashcard.order_index.asc())
-        .all()
-    )
+    all_flashcards = await asyncio.to_thread(_save_flashcards, db, conversation_id, flashcard_data)
     
     return FlashcardListResponse(flashcards=all_flashcards)
 
@@ -275,18 +278,9 @@ def delete_flashcard(
     conversation_id: int,
     flashcard_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    conversation = Depends(get_owned_conversation)
 ):
     """Delete a single flashcard."""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-    
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    
     flashcard = (
         db.query(Flashcard)
         .filter(Flashcard.id == flashcard_id, Flashcard.conversation_id == conversation_id)
@@ -304,17 +298,8 @@ def delete_flashcard(
 def delete_all_flashcards(
     conversation_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    conversation = Depends(get_owned_conversation)
 ):
     """Delete all flashcards for a conversation."""
-    conversation = (
-        db.query(Conversation)
-        .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)
-        .first()
-    )
-    
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    
-    db.query(Flashcard).filter(Flashcard.conversation_id == conversation_id).delete()
+    db.query(Flashcard).filter(Flashcard.conversation_id == conversation_id).delete(synchronize_session=False)
     db.commit()
@@ -1,12 +1,14 @@
+import asyncio
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import func, insert, select, update
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import json
 
 from ..dependencies import get_db, get_current_user
 from ..models.db_models import ChatMessage, Conversation
-from ..utils.embeddings import HybridRAGProcessor
+from ..utils.embeddings import FALLBACK_CHUNK_LIMIT, ChunkColumns, HybridRAGProcessor
 from ..utils.llm_router import get_llm_client
 from ..models.db_models import DocumentChunk, Document
 
@@ -21,16 +23,12 @@ class EditMessageResponse(BaseModel):
     regenerated_response: dict = None
     response_versions: list | None = None
 
-@router.put("/messages/{message_id}")
-async def edit_message(
-    message_id: int,
-    request: EditMessageRequest,
-    regenerate: bool = False,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """Edit a message and optionally regenerate AI response"""
-    
+def _create_edited_version(db: Session, message_id: int, content: str, user_id: int):
+    """Insert the edited text as a new version of a user message.
+
+    Returns (conversation, new_message_id, edit_group_id); the conversation's
+    fields are read before the commit so callers don't trigger a reload.
+    """
     # Find the message
     message = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
     if not message:
@@ -39,7 +37,7 @@ async def edit_message(
     # Verify user owns this conversation
     conversation = (
         db.query(Conversation)
-        .filter(Conversation.id == message.conversation_id, Conversation.user_id == current_user.id)
+        .filter(Conversation.id == message.conversation_id, Conversation.user_id == user_id)
         .first()
     )
     if not conversation:
@@ -51,99 +49,145 @@ async def edit_message(
     # Find the original message in this edit chain
     original_message_id = message.edit_group_id if message.edit_group_id and message.edit_group_id != message.id else message.id
     
-    # Count existing edits in this group to determine version
-    existing_versions = (
-        db.query(ChatMessage)
+    # Highest version in this group determines the next one (indexed MAX, no row count)
+    latest_version = (
+        db.query(func.coalesce(func.max(ChatMessage.version_index), 0))
         .filter(
             ChatMessage.conversation_id == message.conversation_id,
             ChatMessage.role == "user",
             ChatMessage.edit_group_id == original_message_id
         )
-        .count()
+        .scalar()
     )
     
-    new_user_message = ChatMessage(
-        conversation_id=message.conversation_id,
-        role="user",
-        content=request.content,
-        edit_group_id=original_message_id,
-        version_index=existing_versions + 1,
-        is_archived=False,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow(),
-        is_edited=1,
-        reply_to_message_id=message.reply_to_message_id  # Same parent as original - creates sibling branch
-    )
-    db.add(new_user_message)
-    db.flush()
+    # INSERT ... RETURNING gives the new id without a refresh round-trip
+    now = datetime.utcnow()
+    new_user_message_id = db.execute(
+        insert(ChatMessage).returning(ChatMessage.id),
+        {
+            "conversation_id": message.conversation_id,
+            "role": "user",
+            "content": content,
+            "edit_group_id": original_message_id,
+            "version_index": latest_version + 1,
+            "is_archived": False,
+            "created_at": now,
+            "updated_at": now,
+            "is_edited": 1,
+            "reply_to_message_id": message.reply_to_message_id,  # Same parent as original - creates sibling branch
+        },
+    ).scalar_one()
+    
+    conversation_fields = {
+        "id": conversation.id,
+        "llm_mode": conversation.llm_mode,
+        "embedding_model": getattr(conversation, 'embedding_model', 'custom'),
+    }
+    db.commit()
+    return conversation_fields, new_user_message_id, original_message_id
+
+
+def _load_regeneration_inputs(db: Session, conversation_id: int, before_message_id: int):
+    """Load active-document chunks and the history preceding an edit; returns (chunk_columns, chat_history)."""
+    # Respect active documents only (avoid deleted/disabled sources)
+    active_doc_ids = db.execute(
+        select(Document.id)
+        .where(Document.conversation_id == conversation_id, Document.is_active == True)
+    ).scalars().all()
+
+    # Fetch just the three columns ChunkColumns keeps, and only the leading chunks
+    # the SQLite fallback can return
+    chunk_query = select(
+        DocumentChunk.content,
+        DocumentChunk.metadata_json,
+        DocumentChunk.chunk_index,
+    ).where(DocumentChunk.conversation_id == conversation_id)
+    if active_doc_ids:
+        chunk_query = chunk_query.where(DocumentChunk.document_id.in_(active_doc_ids))
+    chunk_query = chunk_query.order_by(DocumentChunk.id).limit(FALLBACK_CHUNK_LIMIT)
+
+    chunk_columns = ChunkColumns.from_rows(db.execute(chunk_query).all())
+
+    # Load chat history up to this message for context (only non-archived from active branch)
+    # Active branch means: messages that come before this edit point and aren't archived
+    # Only role/content are needed, so fetch plain rows instead of full ORM objects
+    chat_history_records = db.execute(
+        select(ChatMessage.role, ChatMessage.content)
+        .where(
+            ChatMessage.conversation_id == conversation_id,
+            ChatMessage.id < before_message_id,
+            ChatMessage.is_archived == False
+        )
+        .order_by(ChatMessage.created_at.asc())
+    ).all()
+    chat_history = [
+        {"role": record.role, "content": record.content}
+        for record in chat_history_records
+    ]
+    return chunk_columns, chat_history
+
+
+def _save_regenerated_response(db: Session, conversation_id: int, values: dict) -> int:
+    """Insert the regenerated assistant reply, touch the conversation, and commit; returns the new id."""
+    new_assistant_response_id = db.execute(
+        insert(ChatMessage).returning(ChatMessage.id),
+        values,
+    ).scalar_one()
     
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=datetime.utcnow())
+    )
     db.commit()
-    db.refresh(new_user_message)
+    return new_assistant_response_id
+
+
+@router.put("/messages/{message_id}")
+async def edit_message(
+    message_id: int,
+    request: EditMessageRequest,
+    regenerate: bool = False,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Edit a message and optionally regenerate AI response"""
+    
+    # The session is synchronous; its queries run in a worker thread, not on the event loop
+    conversation, new_user_message_id, original_message_id = await asyncio.to_thread(
+        _create_edited_version, db, message_id, request.content, current_user.id
+    )
     
     updated_message = {
-        "id": new_user_message.id,
-        "role": new_user_message.role,
-        "content": new_user_message.content,
-        "is_edited": new_user_message.is_edited,
+        "id": new_user_message_id,
+        "role": "user",
+        "content": request.content,
+        "is_edited": 1,
         "sources": [],
-        "edit_group_id": new_user_message.edit_group_id
+        "edit_group_id": original_message_id
     }
     
     response_data = {
         "message": "Message updated successfully",
         "updated_message": updated_message,
-        "new_message_id": new_user_message.id,
-        "archived_message_id": message.id
+        "new_message_id": new_user_message_id,
+        "archived_message_id": message_id
     }
     
-    # If regenerate is requested and message was user, generate new AI response for the new message
-    if regenerate and new_user_message.role == "user":
+    # If regenerate is requested, generate a new AI response for the new user message
+    if regenerate:
         try:
-            # Respect active documents only (avoid deleted/disabled sources)
-            active_docs = (
-                db.query(Document)
-                .filter(Document.conversation_id == conversation.id, Document.is_active == True)
-                .all()
+            chunk_columns, chat_history = await asyncio.to_thread(
+                _load_regeneration_inputs, db, conversation["id"], message_id
             )
-            active_doc_ids = [doc.id for doc in active_docs]
-
-            chunk_query = db.query(DocumentChunk).filter(DocumentChunk.conversation_id == conversation.id)
-            if active_doc_ids:
-                chunk_query = chunk_query.filter(DocumentChunk.document_id.in_(active_doc_ids))
-
-            chunks = chunk_query.all()
-            chunk_dicts = [
-                {
-                    "content": chunk.content,
-                    "metadata_json": chunk.metadata_json,
-                    "chunk_index": chunk.chunk_index,
-                }
-                for chunk in chunks
-            ]
 
-            # Load chat history up to this message for context (only non-archived from active branch)
-            # Active branch means: messages that come before this edit point and aren't archived
-            chat_history_records = (
-                db.query(ChatMessage)
-                .filter(
-                    ChatMessage.conversation_id == conversation.id,
-                    ChatMessage.id < message.id,
-                    ChatMessage.is_archived == False
-                )
-                .order_by(ChatMessage.created_at.asc())
-                .all()
+            hybrid_rag = HybridRAGProcessor(
+                conversation_id=conversation["id"], embedding_model_name=conversation["embedding_model"]
             )
-            chat_history = [
-                {"role": record.role, "content": record.content}
-                for record in chat_history_records
-            ]
-
-            conv_embedding_model = getattr(conversation, 'embedding_model', 'custom')
-            hybrid_rag = HybridRAGProcessor(conversation_id=conversation.id, embedding_model_name=conv_embedding_model)
-            hybrid_rag.load_documents(chunk_dicts)
-            hybrid_rag.load_chat_history(chat_history)
+            hybrid_rag.load_documents(chunk_columns)
 
-            context_result = hybrid_rag.build_context(
+            context_result = await asyncio.to_thread(
+                hybrid_rag.build_context,
                 query=request.content,
                 chat_history=chat_history,
                 doc_k=12,
@@ -159,7 +203,7 @@ async def edit_message(
                 for doc in context_result["document_chunks"]
             ]
 
-            llm_client = get_llm_client(conversation.llm_mode)
+            llm_client = get_llm_client(conversation["llm_mode"])
             result = await llm_client.generate_response(
                 request.content,
                 formatted_context_docs,
@@ -168,33 +212,33 @@ async def edit_message(
             )
             
             # Create a new assistant response for this new user message
-            new_assistant_response = ChatMessage(
-                conversation_id=conversation.id,
-                role="assistant",
-                content=result["response"],
-                sources_json="||".join(result["sources"]) if result["sources"] else None,
-                source_chunks_json=json.dumps(result.get("source_chunks", [])) if result.get("source_chunks") else None,
-                prompt_snapshot=request.content,
-                reply_to_message_id=new_user_message.id,
-                version_index=1,
-                is_archived=False,
-                created_at=datetime.utcnow()
+            new_assistant_response_id = await asyncio.to_thread(
+                _save_regenerated_response,
+                db,
+                conversation["id"],
+                {
+                    "conversation_id": conversation["id"],
+                    "role": "assistant",
+                    "content": result["response"],
+                    "sources_json": result["sources"] or None,
+                    "source_chunks_json": json.dumps(result.get("source_chunks", [])) if result.get("source_chunks") else None,
+                    "prompt_snapshot": request.content,
+                    "reply_to_message_id": new_user_message_id,
+                    "version_index": 1,
+                    "is_archived": False,
+                    "created_at": datetime.utcnow(),
+                },
             )
-            db.add(new_assistant_response)
-            
-            conversation.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(new_assistant_response)
 
             response_data["regenerated_response"] = {
-                "id": new_assistant_response.id,
-                "role": new_assistant_response.role,
-                "content": new_assistant_response.content,
+                "id": new_assistant_response_id,
+                "role": "assistant",
+                "content": result["response"],
                 "sources": result["sources"],
                 "source_chunks": result.get("source_chunks", []),
-                "version_index": new_assistant_response.version_index,
-                "reply_to_message_id": new_assistant_response.reply_to_message_id,
-                "prompt_content": new_assistant_response.prompt_snapshot or request.content
+                "version_index": 1,
+                "reply_to_message_id": new_user_message_id,
+                "prompt_content": request.content
             }
             
         except Exception as e:
@@ -203,7 +247,7 @@ async def edit_message(
     return response_data
 
 @router.delete("/messages/{message_id}")
-async def delete_message(
+def delete_message(
     message_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -224,6 +268,12 @@ async def delete_message(
         raise HTTPException(status_code=403, detail="Access denied")
     
     db.delete(message)
+    # Changes the conversation's ETag without reordering the conversation list
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values(version=func.coalesce(Conversation.version, 0) + 1)
+    )
     db.commit()
     
     return {"message": "Message deleted successfully"}
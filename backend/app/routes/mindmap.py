@@ -409,5 +409,5 @@ def delete_mindmap(
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
     
-    db.query(MindMap).filter(MindMap.conversation_id == conversation_id).delete()
+    db.query(MindMap).filter(MindMap.conversation_id == conversation_id).delete(synchronize_session=False)
     db.commit()
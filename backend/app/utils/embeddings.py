@@ -8,9 +8,16 @@ This module provides:
 
 import hashlib
 import json
+import logging
+import queue
+import re
 import threading
+import time
 import uuid
-from typing import List, Dict, Sequence, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Sequence, Optional, Tuple
 from pathlib import Path
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
@@ -18,12 +25,18 @@ from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
 
+from .semantic_cache import SemanticAnswerCache
 from ..config import (
     CHUNK_SIZE, CHUNK_OVERLAP, 
-    QDRANT_HOST, QDRANT_PORT, QDRANT_COLLECTION_NAME,
-    EMBEDDING_MODEL, EMBEDDING_DIMENSION
+    QDRANT_HOST, QDRANT_PORT, QDRANT_COLLECTION_NAME, QDRANT_QUANTIZATION,
+    QDRANT_PQ_COMPRESSION,
+    EMBEDDING_MODEL, EMBEDDING_DIMENSION,
+    EMBEDDING_QUANTIZATION, EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX,
+    RERANKER_MODEL, RERANK_CANDIDATES, MMR_DIVERSITY, MMR_SOURCE_PENALTY
 )
 
+logger = logging.getLogger(__name__)
+
 # Global embedding model instances (loaded once per model type)
 _embedding_models: Dict[str, object] = {}
 _qdrant_client: Optional[QdrantClient] = None
@@ -31,6 +44,22 @@ _qdrant_initialized: bool = False
 _qdrant_init_lock = threading.Lock()
 _embedding_init_lock = threading.Lock()
 _qdrant_client_lock = threading.Lock()
+_query_batchers: Dict[str, "QueryEmbeddingBatcher"] = {}
+# Runs Qdrant searches so chat-history search can proceed alongside them
+_document_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-doc-search")
+_query_batcher_lock = threading.Lock()
+
+# Cross-encoder reranker (loaded once; a failed load disables reranking)
+_reranker_model = None
+_reranker_failed: bool = False
+_reranker_init_lock = threading.Lock()
+
+# Per-conversation HybridRAGProcessor cache (LRU, keyed by conversation_id)
+_RAG_CACHE_MAX_ENTRIES = 64
+_rag_cache: "OrderedDict[int, Tuple[tuple, HybridRAGProcessor]]" = OrderedDict()
+_rag_cache_lock = threading.Lock()
+# Chat chunk vectors kept per processor (LRU, keyed by chunk text)
+_CHAT_EMBEDDING_CACHE_MAX_ENTRIES = 512
 
 # Model name constants
 ALLMINILM_MODEL_NAME = "all-MiniLM-L6-v2"
@@ -74,11 +103,113 @@ def get_embedding_model(model_name: str = None):
             model = SentenceTransformer(model_name, trust_remote_code=trust_code)
             print(f"[Embeddings] Model loaded successfully")
         
+        if EMBEDDING_QUANTIZATION == "int8":
+            model = _quantize_int8(model)
+        
         _embedding_models[model_name] = model
     
     return _embedding_models[model_name]
 
 
+def _quantize_int8(model):
+    """Swap the model's Linear layers for dynamically quantized INT8 ones (CPU inference)."""
+    import torch
+    try:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print("[Embeddings] Using dynamic INT8 weights")
+    except Exception as e:
+        print(f"[Embeddings] INT8 quantization failed, keeping FP32 weights: {e}")
+    return model
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces encode calls from concurrent requests into shared model batches.
+    
+    Callers block in their own worker threads; a single background thread waits up
+    to EMBEDDING_BATCH_WINDOW_MS after the first request for others to arrive, then
+    encodes up to EMBEDDING_BATCH_MAX texts in one forward pass.
+    """
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._pending: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"embed-batcher-{model_name}", daemon=True)
+        self._worker.start()
+    
+    def encode(self, texts: List[str]):
+        """Embed ``texts`` (returns one row per text), sharing the forward pass with concurrent callers."""
+        future: Future = Future()
+        self._pending.put((texts, future))
+        return future.result()
+    
+    def _run(self):
+        window = EMBEDDING_BATCH_WINDOW_MS / 1000
+        while True:
+            batch = [self._pending.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + window
+            while size < EMBEDDING_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                embeddings = get_embedding_model(self.model_name).encode(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(embeddings[start:start + len(item_texts)])
+                start += len(item_texts)
+
+
+def get_query_batcher(model_name: str = None) -> QueryEmbeddingBatcher:
+    """Get the shared query batcher for an embedding model (one per model, thread-safe)."""
+    model_name = (model_name or EMBEDDING_MODEL).lower().strip()
+    batcher = _query_batchers.get(model_name)
+    if batcher is None:
+        with _query_batcher_lock:
+            batcher = _query_batchers.get(model_name)
+            if batcher is None:
+                batcher = _query_batchers[model_name] = QueryEmbeddingBatcher(model_name)
+    return batcher
+
+
+def get_reranker_model():
+    """Get the cross-encoder used to rerank retrieved chunks (singleton, thread-safe).
+    
+    Returns None when RERANKER_MODEL is empty or the model can't be loaded, in which
+    case callers keep the dense retrieval order.
+    """
+    global _reranker_model, _reranker_failed
+    
+    if _reranker_model is not None or _reranker_failed or not RERANKER_MODEL:
+        return _reranker_model
+    
+    with _reranker_init_lock:
+        if _reranker_model is None and not _reranker_failed:
+            try:
+                print(f"[Reranker] Loading model: {RERANKER_MODEL}")
+                from sentence_transformers import CrossEncoder
+                _reranker_model = CrossEncoder(RERANKER_MODEL)
+                print("[Reranker] Model loaded successfully")
+            except Exception as e:
+                print(f"[Reranker] Could not load {RERANKER_MODEL}, keeping dense ranking: {e}")
+                _reranker_failed = True
+    
+    return _reranker_model
+
+
 def get_qdrant_client() -> QdrantClient:
     """Get Qdrant client instance (singleton pattern, thread-safe).
     
@@ -111,6 +242,59 @@ def get_qdrant_client() -> QdrantClient:
     return _qdrant_client
 
 
+def _quantization_config():
+    """Build the collection quantization config selected by QDRANT_QUANTIZATION."""
+    if QDRANT_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+        )
+    if QDRANT_QUANTIZATION == "product":
+        # Sub-vector codebooks shrink each vector 4-64x, for collections that outgrow INT8 in RAM
+        return models.ProductQuantization(
+            product=models.ProductQuantizationConfig(
+                compression=models.CompressionRatio(QDRANT_PQ_COMPRESSION), always_ram=True
+            )
+        )
+    if QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+# Search quantized vectors, then rescore the oversampled candidates with the originals.
+# Product codes are coarser than INT8, so they pull a wider candidate pool to rescore
+_QUANTIZED_SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(
+        rescore=True, oversampling=4.0 if QDRANT_QUANTIZATION == "product" else 2.0
+    )
+)
+
+
+# Payload keys read back from search hits; skips conversation_id and chunk_id on the wire
+_SEARCH_PAYLOAD_FIELDS = ["content", "source", "chunk_index", "document_id", "type"]
+
+
+# A word of a title-case heading: capitalized, a number, or a short connective
+_TITLE_WORD = r"(?:[A-Z0-9][\w'-]*|a|an|and|as|at|by|for|from|in|of|on|or|the|to|vs|with)"
+# Markdown headings ("## Results") and numbered section titles ("2.1 Results and Discussion").
+# A numbered line only counts when it is a short title-case phrase with no punctuation,
+# so list items such as "1. First install the package" are not taken for sections
+_HEADING_RE = re.compile(
+    rf"^[ \t]*(?:#{{1,6}}[ \t]+(.+?)|(\d+(?:\.\d+)*\.?[ \t]+[A-Z][\w'-]*(?:[ \t]+{_TITLE_WORD}){{0,7}}))[ \t]*$",
+    re.MULTILINE
+)
+
+
+def _contextual_prefix(source: str, section: Optional[str]) -> str:
+    """One sentence placing a chunk in its document, embedded ahead of the chunk text."""
+    title, _, page = source.partition("_page_")
+    prefix = f"This excerpt is from {title}"
+    if page:
+        prefix += f", page {page}"
+    if section:
+        prefix += f', section "{section}"'
+    return prefix + "."
+
+
 def ensure_collection_exists(client: QdrantClient, collection_name: str = QDRANT_COLLECTION_NAME):
     """Create collection if it doesn't exist (thread-safe)."""
     global _qdrant_initialized
@@ -128,22 +312,35 @@ def ensure_collection_exists(client: QdrantClient, collection_name: str = QDRANT
             collections = client.get_collections().collections
             exists = any(c.name == collection_name for c in collections)
             
+            quantization_config = _quantization_config()
             if not exists:
                 print(f"[Qdrant] Creating collection: {collection_name}")
                 client.create_collection(
                     collection_name=collection_name,
                     vectors_config=VectorParams(
                         size=EMBEDDING_DIMENSION,
-                        distance=Distance.COSINE
-                    )
+                        distance=Distance.COSINE,
+                        # Quantized copies stay in RAM; originals are only read to rescore,
+                        # so they can live in mmapped storage
+                        on_disk=quantization_config is not None
+                    ),
+                    quantization_config=quantization_config
                 )
                 print(f"[Qdrant] Collection created")
+            elif quantization_config is not None:
+                # Enable quantization on collections created before it was configured
+                info = client.get_collection(collection_name)
+                if info.config.quantization_config is None:
+                    print(f"[Qdrant] Enabling {QDRANT_QUANTIZATION} quantization on {collection_name}")
+                    client.update_collection(
+                        collection_name=collection_name,
+                        vectors_config={"": models.VectorParamsDiff(on_disk=True)},
+                        quantization_config=quantization_config
+                    )
             
             _qdrant_initialized = True
         except Exception as e:
             # Do NOT set _qdrant_initialized on error - allow retries
-            import logging
-            logger = logging.getLogger(__name__)
             logger.exception("Error ensuring Qdrant collection")
             raise  # Re-raise to let callers fail fast
 
@@ -197,13 +394,23 @@ class QdrantVectorStore:
         """
         texts = []
         metadatas = []
+        prefixes = []
         
         for source, text in text_data.items():
             chunks = self.text_splitter.split_text(text)
             doc_id = document_ids.get(source) if document_ids else None
+            section = None
             
             for i, chunk in enumerate(chunks):
+                # A chunk belongs to the heading it opens with, else the last one seen before it
+                headings = [h1 or h2 for h1, h2 in _HEADING_RE.findall(chunk)]
+                opening = _HEADING_RE.match(chunk)
+                prefix = _contextual_prefix(source, (opening.group(1) or opening.group(2)).strip() if opening else section)
+                if headings:
+                    section = headings[-1].strip()
+                
                 texts.append(chunk)
+                prefixes.append(prefix)
                 metadatas.append({
                     "source": source,
                     "chunk_index": i,
@@ -216,9 +423,12 @@ class QdrantVectorStore:
         if not texts:
             return 0, [], []
         
-        # Generate embeddings in batch
-        print(f"[Qdrant] Generating embeddings for {len(texts)} chunks...")
-        embeddings = self.embed_texts(texts)
+        # Generate embeddings in batch. The prefix gives each vector its document and
+        # section; the stored content stays the bare chunk, which is what the LLM sees.
+        # Vectors ingested before prefixes were added stay bare until their document is
+        # re-uploaded, and score somewhat differently from prefixed ones meanwhile
+        logger.debug("[Qdrant] Generating embeddings for %d chunks", len(texts))
+        embeddings = self.embed_texts([f"{prefix}\n{text}" for prefix, text in zip(prefixes, texts)])
         
         points = []
         for i, (text, embedding, metadata) in enumerate(zip(texts, embeddings, metadatas)):
@@ -245,14 +455,16 @@ class QdrantVectorStore:
                 points=batch
             )
         
-        print(f"[Qdrant] Added {len(points)} vectors to collection")
+        logger.debug("[Qdrant] Added %d vectors to collection", len(points))
         return len(points), texts, metadatas
     
     def search(
         self, 
         query: str, 
         k: int = 5,
-        document_ids: Optional[List[int]] = None
+        document_ids: Optional[List[int]] = None,
+        query_embedding: Optional[List[float]] = None,
+        with_vectors: bool = False
     ) -> List[Dict]:
         """
         Semantic search in vector store.
@@ -261,12 +473,15 @@ class QdrantVectorStore:
             query: Search query
             k: Number of results
             document_ids: Optional list of document_ids to filter (for active documents)
+            query_embedding: Precomputed query vector; embeds ``query`` when omitted
+            with_vectors: Also return each hit's stored vector under ``"vector"``
             
         Returns:
             List of results with content, metadata, and score
         """
         try:
-            query_embedding = self.embed_text(query)
+            if query_embedding is None:
+                query_embedding = self.embed_text(query)
             
             # Build filter conditions
             must_conditions = [
@@ -292,8 +507,10 @@ class QdrantVectorStore:
                 collection_name=self.collection_name,
                 query=query_embedding,  # must be a flat 1D list
                 query_filter=search_filter,
+                search_params=_QUANTIZED_SEARCH_PARAMS if QDRANT_QUANTIZATION != "none" else None,
                 limit=k,
-                with_payload=True
+                with_payload=_SEARCH_PAYLOAD_FIELDS,
+                with_vectors=with_vectors
             ).points
             
             # Build results with adjusted scores
@@ -321,7 +538,7 @@ class QdrantVectorStore:
                 
                 adjusted_score = hit.score + length_boost
                 
-                raw_results.append({
+                result = {
                     "content": content,
                     "metadata": {
                         "source": hit.payload.get("source", "Unknown"),
@@ -331,14 +548,17 @@ class QdrantVectorStore:
                     },
                     "score": adjusted_score,
                     "raw_score": hit.score
-                })
+                }
+                if with_vectors:
+                    result["vector"] = hit.vector
+                raw_results.append(result)
             
             # Re-sort by adjusted score
             raw_results.sort(key=lambda x: x["score"], reverse=True)
             
             return raw_results
         except Exception as e:
-            print(f"[Qdrant] Search error: {e}")
+            logger.warning("[Qdrant] Search error: %s", e)
             raise
     
     def delete_by_document(self, document_id: int) -> Optional[str]:
@@ -361,7 +581,7 @@ class QdrantVectorStore:
             )
         )
         operation_id = getattr(result, 'operation_id', None)
-        print(f"[Qdrant] Deleted vectors for document {document_id}, operation_id={operation_id}")
+        logger.debug("[Qdrant] Deleted vectors for document %s, operation_id=%s", document_id, operation_id)
         return operation_id
     
     def delete_by_conversation(self) -> Optional[str]:
@@ -380,7 +600,7 @@ class QdrantVectorStore:
             )
         )
         operation_id = getattr(result, 'operation_id', None)
-        print(f"[Qdrant] Deleted all vectors for conversation {self.conversation_id}, operation_id={operation_id}")
+        logger.debug("[Qdrant] Deleted all vectors for conversation %s, operation_id=%s", self.conversation_id, operation_id)
         return operation_id
 
 
@@ -443,6 +663,39 @@ class EmbeddingProcessor:
         return self
 
 
+# Splits past Q&A pairs for chat-history search; stateless, so every processor shares it
+_CHAT_HISTORY_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=300,
+    chunk_overlap=50,
+    length_function=len,
+)
+
+
+# The SQLite fallback only ever returns the first doc_k chunks (12 at most in the routes),
+# so callers load at most this many instead of every chunk of the conversation
+FALLBACK_CHUNK_LIMIT = 16
+
+
+@dataclass(slots=True)
+class ChunkColumns:
+    """SQLite chunks stored column-wise: one list per field instead of one dict per chunk."""
+    content: List[str]
+    metadata_json: List[Optional[str]]
+    chunk_index: List[int]
+    
+    @classmethod
+    def from_rows(cls, rows: Sequence) -> "ChunkColumns":
+        """Build from DocumentChunk rows (anything with content/metadata_json/chunk_index)."""
+        return cls(
+            content=[row.content for row in rows],
+            metadata_json=[row.metadata_json for row in rows],
+            chunk_index=[row.chunk_index for row in rows],
+        )
+    
+    def __len__(self) -> int:
+        return len(self.content)
+
+
 class HybridRAGProcessor:
     """
     Hybrid RAG processor that combines:
@@ -456,44 +709,42 @@ class HybridRAGProcessor:
         self.embedding_model_name = embedding_model_name
         self.vector_store: Optional[QdrantVectorStore] = None
         self.active_document_ids: Optional[List[int]] = None
-        self._fallback_chunks: Sequence[Dict] = []
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=300,
-            chunk_overlap=50,
-            length_function=len,
-        )
-        self._chat_texts = []
-        self._chat_metadatas = []
-        self._chat_embeddings = None
+        self._fallback_chunks: Optional[ChunkColumns] = None
+        self.text_splitter = _CHAT_HISTORY_SPLITTER
+        # Chat chunk vectors keyed by their text, shared by every request on this
+        # conversation; each request passes its own branch history to hybrid_search
+        self._chat_embedding_cache: "OrderedDict[str, object]" = OrderedDict()
+        self._chat_embedding_lock = threading.Lock()
+        # Answers to earlier questions; lives and dies with this processor, so it is
+        # dropped whenever the documents change and the processor is rebuilt
+        self.answer_cache = SemanticAnswerCache()
     
-    def load_documents(self, chunks: Sequence[Dict] = None, document_ids: List[int] = None):
+    def load_documents(self, chunks: Optional[ChunkColumns] = None, document_ids: List[int] = None):
         """
         Initialize vector store for document search.
         
         Args:
-            chunks: SQLite chunks as fallback (used if Qdrant returns no results)
+            chunks: SQLite chunks as fallback (used if Qdrant returns no results);
+                only the first doc_k are used, see FALLBACK_CHUNK_LIMIT
             document_ids: List of active document IDs to filter search
         """
         # Store SQLite chunks as fallback
-        self._fallback_chunks = chunks or []
+        self._fallback_chunks = chunks
         
         if self.conversation_id:
             try:
                 self.vector_store = QdrantVectorStore(self.conversation_id, self.embedding_model_name)
                 self.active_document_ids = document_ids
             except Exception as e:
-                print(f"[RAG] Error initializing Qdrant: {e}")
+                logger.warning("[RAG] Error initializing Qdrant: %s", e)
                 self.vector_store = None
         return self
     
-    def load_chat_history(self, chat_messages: List[Dict]):
+    def _chat_history_entries(self, chat_messages: List[Dict]) -> Tuple[List[str], List[Dict]]:
         """
-        Load chat history for context.
+        Split chat history into searchable (texts, metadatas).
         Uses in-memory embedding for chat (not stored in Qdrant).
         """
-        if not chat_messages:
-            return self
-        
         texts = []
         metadatas = []
         
@@ -523,33 +774,75 @@ class HybridRAGProcessor:
                     })
             i += 1
         
-        self._chat_texts = texts
-        self._chat_metadatas = metadatas
+        return texts, metadatas
+    
+    def _embed_query(self, query: str, chat_texts: Optional[List[str]] = None, query_emb=None):
+        """Embed the query, plus any uncached ``chat_texts``, in one encode call.
         
-        # Pre-compute and cache chat embeddings
+        The call goes through the model's shared batcher, so it blocks the calling thread
+        and may share a forward pass with other requests. A ``query_emb`` computed
+        earlier is reused rather than encoded again.
+        Returns (query embedding, chat text embeddings or None).
+        """
+        import numpy as np
+        cache = self._chat_embedding_cache
+        known = {}
+        missing = []
+        if chat_texts:
+            with self._chat_embedding_lock:
+                for text in dict.fromkeys(chat_texts):
+                    if text in cache:
+                        cache.move_to_end(text)
+                        known[text] = cache[text]
+                    else:
+                        missing.append(text)
+        
+        texts = missing if query_emb is not None else [query] + missing
         if texts:
-            model = get_embedding_model(self.embedding_model_name)
-            self._chat_embeddings = model.encode(texts)
-        else:
-            self._chat_embeddings = None
+            embeddings = get_query_batcher(self.embedding_model_name).encode(texts)
+            if query_emb is None:
+                query_emb, embeddings = embeddings[0], embeddings[1:]
+            known.update(zip(missing, embeddings))
+            if missing:
+                with self._chat_embedding_lock:
+                    cache.update(zip(missing, embeddings))
+                    while len(cache) > _CHAT_EMBEDDING_CACHE_MAX_ENTRIES:
+                        cache.popitem(last=False)
+        chat_embeddings = None
+        if chat_texts:
+            chat_embeddings = np.array([known[text] for text in chat_texts])
         
-        return self
+        return np.asarray(query_emb).flatten(), chat_embeddings
+    
+    def find_cached_answer(self, query: str, scope) -> Tuple[Optional[Dict], object]:
+        """Look up an answer given to a near-duplicate question under ``scope``.
+        
+        Returns (result or None, query embedding); pass the embedding on to
+        ``build_context`` and ``cache_answer`` so the query is only encoded once.
+        """
+        query_emb, _ = self._embed_query(query)
+        return self.answer_cache.get(query_emb, scope), query_emb
+    
+    def cache_answer(self, query_emb, scope, result: Dict) -> None:
+        """Remember an LLM result so near-duplicate questions can reuse it."""
+        self.answer_cache.put(query_emb, scope, result)
     
-    def _search_chat_history(self, query: str, k: int = 3) -> List[Dict]:
+    @staticmethod
+    def _search_chat_history(
+        query_emb, chat_texts: List[str], chat_metadatas: List[Dict], chat_embeddings, k: int = 3
+    ) -> List[Dict]:
         """Search chat history using cached embedding similarity."""
-        if not self._chat_texts or self._chat_embeddings is None:
+        if not chat_texts or chat_embeddings is None:
             return []
         
-        model = get_embedding_model(self.embedding_model_name)
         import numpy as np
-        query_emb = np.array(model.encode([query] if isinstance(query, str) else query)).flatten()
         
         # Compute cosine similarities with epsilon to guard against zero-norm division
         epsilon = 1e-8
-        text_norms = np.linalg.norm(self._chat_embeddings, axis=1)
+        text_norms = np.linalg.norm(chat_embeddings, axis=1)
         query_norm = np.linalg.norm(query_emb)
         # Add epsilon to prevent division by zero
-        similarities = np.dot(self._chat_embeddings, query_emb) / (
+        similarities = np.dot(chat_embeddings, query_emb) / (
             np.maximum(text_norms, epsilon) * max(query_norm, epsilon)
         )
         
@@ -557,24 +850,108 @@ class HybridRAGProcessor:
         
         return [
             {
-                "content": self._chat_texts[idx],
-                "metadata": self._chat_metadatas[idx],
+                "content": chat_texts[idx],
+                "metadata": chat_metadatas[idx],
                 "score": float(similarities[idx])
             }
             for idx in top_indices
         ]
     
+    def _search_documents(self, query: str, query_emb, doc_k: int) -> List[Dict]:
+        """Search Qdrant for document chunks; over-fetch, rerank, then pick a diverse final doc_k."""
+        reranker = get_reranker_model()
+        diversify = MMR_DIVERSITY > 0 or MMR_SOURCE_PENALTY > 0
+        over_fetch = reranker is not None or diversify
+        candidates = self.vector_store.search(
+            query=query,
+            k=max(doc_k, RERANK_CANDIDATES) if over_fetch else doc_k,
+            document_ids=self.active_document_ids,
+            query_embedding=query_emb.tolist(),
+            with_vectors=MMR_DIVERSITY > 0
+        )
+        if reranker is not None:
+            # Keep the whole pool when MMR makes the final cut
+            candidates = self._rerank(reranker, query, candidates, len(candidates) if diversify else doc_k)
+        if diversify:
+            candidates = self._diversify(candidates, doc_k)
+        return candidates
+    
+    @staticmethod
+    def _rerank(reranker, query: str, candidates: List[Dict], k: int) -> List[Dict]:
+        """Order retrieved chunks by cross-encoder relevance to the query and keep the top ``k``."""
+        if len(candidates) <= 1:
+            return candidates
+        try:
+            scores = reranker.predict([(query, chunk["content"]) for chunk in candidates])
+        except Exception as e:
+            logger.warning("[Reranker] Scoring failed, keeping dense ranking: %s", e)
+            return candidates[:k]
+        
+        for chunk, score in zip(candidates, scores):
+            chunk["rerank_score"] = float(score)
+        candidates.sort(key=lambda chunk: chunk["rerank_score"], reverse=True)
+        return candidates[:k]
+    
+    @staticmethod
+    def _diversify(candidates: List[Dict], k: int) -> List[Dict]:
+        """Pick ``k`` chunks by Maximal Marginal Relevance over the ranked candidates.
+        
+        Each pick maximizes relevance minus MMR_DIVERSITY times its highest cosine
+        similarity to the chunks already picked, minus MMR_SOURCE_PENALTY if its
+        document is already represented. Returns them in pick order.
+        """
+        import numpy as np
+        
+        vectors = [chunk.pop("vector", None) for chunk in candidates]
+        if len(candidates) <= 1:
+            return candidates
+        
+        # Reranker logits and cosine scores live on different scales; map relevance to [0, 1]
+        relevance = np.array([chunk.get("rerank_score", chunk["score"]) for chunk in candidates], dtype=np.float32)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+        
+        if MMR_DIVERSITY > 0 and all(vector is not None for vector in vectors):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            similarity = matrix @ matrix.T
+        else:
+            similarity = None
+        
+        sources = [
+            chunk["metadata"].get("document_id") or chunk["metadata"].get("source")
+            for chunk in candidates
+        ]
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        source_seen = np.zeros(len(candidates), dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        selected = []
+        
+        for _ in range(min(k, len(candidates))):
+            mmr = relevance - MMR_DIVERSITY * redundancy - MMR_SOURCE_PENALTY * source_seen
+            mmr[~available] = -np.inf
+            pick = int(np.argmax(mmr))
+            selected.append(candidates[pick])
+            available[pick] = False
+            if similarity is not None:
+                np.maximum(redundancy, similarity[pick], out=redundancy)
+            source_seen[[i for i, source in enumerate(sources) if source == sources[pick]]] = 1.0
+        
+        return selected
+    
     def hybrid_search(
         self, 
         query: str, 
         chat_history: List[Dict],
         doc_k: int = 8,
         chat_k: int = 3,
-        recent_messages: int = 8
+        recent_messages: int = 8,
+        document_chunks: Optional[List[Dict]] = None,
+        query_embedding=None
     ) -> Dict:
         """
         Perform hybrid search combining:
-        1. Relevant document chunks from Qdrant
+        1. Relevant document chunks from Qdrant (skipped when ``document_chunks`` is given)
         2. Relevant past Q&A from chat history
         3. Most recent messages for conversational context
         """
@@ -584,42 +961,63 @@ class HybridRAGProcessor:
             "recent_context": []
         }
         
-        # 1. Search document chunks in Qdrant
-        if self.vector_store:
-            results["document_chunks"] = self.vector_store.search(
-                query=query,
-                k=doc_k,
-                document_ids=self.active_document_ids
+        search_docs = document_chunks is None and self.vector_store is not None
+        chat_texts, chat_metadatas = [], []
+        if chat_history and len(chat_history) > recent_messages:
+            chat_texts, chat_metadatas = self._chat_history_entries(chat_history)
+        search_chat = bool(chat_texts)
+        
+        # Query and uncached chat texts share one embedding call
+        query_emb, chat_embeddings = query_embedding, None
+        if search_docs or search_chat:
+            query_emb, chat_embeddings = self._embed_query(
+                query, chat_texts if search_chat else None, query_emb=query_emb
+            )
+        
+        # Both searches start from the same embedding: the Qdrant round-trip runs on the
+        # search pool while chat history is scored here
+        document_search = None
+        if search_docs:
+            document_search = _document_search_executor.submit(self._search_documents, query, query_emb, doc_k)
+        
+        # 2. Search relevant past conversations
+        if search_chat:
+            results["relevant_chat_history"] = self._search_chat_history(
+                query_emb, chat_texts, chat_metadatas, chat_embeddings, k=chat_k
             )
         
+        # 1. Document chunks from Qdrant, unless the caller already has them
+        if document_chunks is not None:
+            results["document_chunks"] = document_chunks
+        elif document_search is not None:
+            results["document_chunks"] = document_search.result()
+        
         # Fallback to SQLite chunks if Qdrant returned no results
-        if not results["document_chunks"] and hasattr(self, '_fallback_chunks') and self._fallback_chunks:
-            print("[RAG] Qdrant returned no results, using SQLite fallback")
+        if not results["document_chunks"] and self._fallback_chunks:
+            logger.debug("[RAG] Qdrant returned no results, using SQLite fallback")
             # Use first N chunks from SQLite as fallback
+            fallback = self._fallback_chunks
             fallback_results = []
-            for i, chunk in enumerate(self._fallback_chunks[:doc_k]):
-                content = chunk.get("content", "")
-                metadata = chunk.get("metadata_json", {})
+            for content, metadata, chunk_index in zip(
+                fallback.content[:doc_k], fallback.metadata_json[:doc_k], fallback.chunk_index[:doc_k]
+            ):
                 if isinstance(metadata, str):
                     try:
                         metadata = json.loads(metadata)
                     except (json.JSONDecodeError, TypeError):
                         metadata = {}
+                metadata = metadata or {}
                 fallback_results.append({
-                    "content": content,
+                    "content": content or "",
                     "metadata": {
                         "source": metadata.get("source", "Document"),
-                        "chunk_index": chunk.get("chunk_index", i),
+                        "chunk_index": chunk_index,
                         "type": "document"
                     },
                     "score": 0.5  # Default score for fallback
                 })
             results["document_chunks"] = fallback_results
         
-        # 2. Search relevant past conversations
-        if self._chat_texts and len(chat_history) > recent_messages:
-            results["relevant_chat_history"] = self._search_chat_history(query, k=chat_k)
-        
         # 3. Get most recent messages for conversational context
         if chat_history:
             recent = chat_history[-recent_messages:] if len(chat_history) > recent_messages else chat_history
@@ -633,10 +1031,19 @@ class HybridRAGProcessor:
         chat_history: List[Dict],
         doc_k: int = 8,
         chat_k: int = 3,
-        recent_messages: int = 8
+        recent_messages: int = 8,
+        document_chunks: Optional[List[Dict]] = None,
+        query_embedding=None
     ) -> Dict:
-        """Build a comprehensive context for the LLM combining all sources."""
-        search_results = self.hybrid_search(query, chat_history, doc_k, chat_k, recent_messages)
+        """Build a comprehensive context for the LLM combining all sources.
+        
+        ``document_chunks`` lets callers reuse a previous retrieval instead of querying Qdrant,
+        and ``query_embedding`` one already computed by ``find_cached_answer``.
+        """
+        search_results = self.hybrid_search(
+            query, chat_history, doc_k, chat_k, recent_messages,
+            document_chunks=document_chunks, query_embedding=query_embedding
+        )
         
         context_parts = []
         
@@ -665,3 +1072,46 @@ class HybridRAGProcessor:
             "relevant_chat_history": search_results["relevant_chat_history"],
             "recent_context": search_results["recent_context"]
         }
+
+
+def get_hybrid_rag_processor(
+    conversation_id: int,
+    embedding_model_name: str,
+    signature: tuple,
+    chunks: Optional[ChunkColumns] = None,
+    document_ids: List[int] = None,
+    chunks_loader: Optional[Callable[[], ChunkColumns]] = None,
+) -> HybridRAGProcessor:
+    """Get a HybridRAGProcessor for a conversation, reused across requests (thread-safe).
+    
+    The cached processor is rebuilt whenever ``signature`` changes, so callers should
+    derive it from the active documents and their chunks. ``chunks_loader`` is only
+    called on a rebuild, so chunk rows needn't be fetched for a cache hit.
+    """
+    cache_key = (embedding_model_name, signature)
+    
+    with _rag_cache_lock:
+        cached = _rag_cache.get(conversation_id)
+        if cached is not None and cached[0] == cache_key:
+            _rag_cache.move_to_end(conversation_id)
+            return cached[1]
+    
+    if chunks is None and chunks_loader is not None:
+        chunks = chunks_loader()
+    
+    processor = HybridRAGProcessor(conversation_id=conversation_id, embedding_model_name=embedding_model_name)
+    processor.load_documents(chunks=chunks, document_ids=document_ids)
+    
+    with _rag_cache_lock:
+        _rag_cache[conversation_id] = (cache_key, processor)
+        _rag_cache.move_to_end(conversation_id)
+        while len(_rag_cache) > _RAG_CACHE_MAX_ENTRIES:
+            _rag_cache.popitem(last=False)
+    
+    return processor
+
+
+def invalidate_hybrid_rag_processor(conversation_id: int) -> None:
+    """Drop the cached processor for a conversation after its documents change or it is deleted."""
+    with _rag_cache_lock:
+        _rag_cache.pop(conversation_id, None)
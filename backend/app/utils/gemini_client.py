@@ -1,5 +1,6 @@
 import google.generativeai as genai
 from typing import List, Dict, Optional, AsyncGenerator
+from .llm_router import is_summary_request
 from ..config import GEMINI_API_KEY
 
 class GeminiClient:
@@ -58,10 +59,7 @@ class GeminiClient:
         chat_history: List[Dict],
         hybrid_context: Optional[str] = None
     ) -> str:
-        is_summary_request = any(word in query.lower() for word in [
-            'summarize', 'summary', 'summarise', 'sumary', 'brief',
-            'overview', 'gist', 'main points', 'key points', 'highlights'
-        ])
+        summary_request = is_summary_request(query)
 
         context_text = self._format_context(context_docs)
         history_text = self._format_history(chat_history)
@@ -74,7 +72,7 @@ PAST CONVERSATIONS:
         else:
             enhanced_context = context_text
 
-        if is_summary_request:
+        if summary_request:
             prompt = f"""You are a helpful document assistant. Answer questions based on the uploaded documents.
 
 INSTRUCTIONS:
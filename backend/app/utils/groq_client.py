@@ -83,11 +83,6 @@ class GroqClient:
         chat_history: List[Dict],
         hybrid_context: Optional[str] = None
     ) -> List[Dict]:
-        is_summary_request = any(word in query.lower() for word in [
-            'summarize', 'summary', 'summarise', 'sumary', 'brief',
-            'overview', 'gist', 'main points', 'key points', 'highlights'
-        ])
-
         context_text = self._format_context(context_docs)
         history_text = self._format_history(chat_history)
 
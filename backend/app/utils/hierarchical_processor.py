@@ -6,6 +6,10 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Markdown code fences LLMs wrap their JSON in
+_FENCE_OPEN_RE = re.compile(r'```(?:json)?\s*')
+_FENCE_CLOSE_RE = re.compile(r'\s*```')
+
 
 def _select_intelligent_chunks(all_chunks: List[Dict], target_count: int = 8) -> List[Dict]:
     """
@@ -110,7 +114,7 @@ async def hierarchical_summarization(
     selected_chunks = _select_intelligent_chunks(all_chunks, target_count=chunk_count)
     
     mode_label = "LOCAL/GPU" if is_local else "CLOUD/API"
-    print(f"[Summary] Selected {len(selected_chunks)} chunks from {len(all_chunks)} total ({mode_label} MODE)")
+    logger.debug("[Summary] Selected %d chunks from %d total (%s MODE)", len(selected_chunks), len(all_chunks), mode_label)
     context = "\n\n".join([chunk["content"] for chunk in selected_chunks])
     
     prompt = f"""Provide a comprehensive summary of the following document content:
@@ -124,7 +128,7 @@ Create a detailed summary covering all major topics, key points, and important d
         # Process in batches for better coverage
         batch_size = 10
         batches = [selected_chunks[i:i+batch_size] for i in range(0, len(selected_chunks), batch_size)]
-        print(f"[Summary] Using {len(batches)} batches for comprehensive coverage")
+        logger.debug("[Summary] Using %d batches for comprehensive coverage", len(batches))
         
         summaries = []
         for batch_idx, batch in enumerate(batches):
@@ -135,7 +139,7 @@ Create a detailed summary covering all major topics, key points, and important d
 
 Provide a concise summary of key points and main ideas."""
             
-            print(f"[Summary] Processing batch {batch_idx + 1}/{len(batches)}...")
+            logger.debug("[Summary] Processing batch %d/%d", batch_idx + 1, len(batches))
             response = await llm_client.generate_simple_response(batch_prompt)
             if response and response.strip():
                 summaries.append(response.strip())
@@ -149,9 +153,9 @@ Provide a concise summary of key points and main ideas."""
 
 Create a unified, well-structured summary covering all major topics."""
             
-            print(f"[Summary] Merging {len(summaries)} partial summaries...")
+            logger.debug("[Summary] Merging %d partial summaries", len(summaries))
             final_summary = await llm_client.generate_simple_response(final_prompt)
-            print(f"[Summary] Final summary: {len(final_summary)} chars")
+            logger.debug("[Summary] Final summary: %d chars", len(final_summary))
             return final_summary
         else:
             return "Unable to generate summary."
@@ -159,10 +163,10 @@ Create a unified, well-structured summary covering all major topics."""
         # Single-shot for cloud or small documents
         import time
         start_time = time.time()
-        print(f"[Summary] Starting generation...")
+        logger.debug("[Summary] Starting generation")
         response_text = await llm_client.generate_simple_response(prompt)
         elapsed = time.time() - start_time
-        print(f"[Summary] Completed in {elapsed:.2f}s")
+        logger.debug("[Summary] Completed in %.2fs", elapsed)
         
         return response_text
 
@@ -296,8 +300,8 @@ async def hierarchical_flashcard_generation(
     selected_chunks = _select_intelligent_chunks(all_chunks, target_count=chunk_count)
     
     mode_label = "LOCAL/GPU" if is_local else "CLOUD/API"
-    print(f"[Flashcards] Selected {len(selected_chunks)} chunks from {len(all_chunks)} total ({mode_label} MODE)")
-    print(f"[Flashcards] Avoiding {len(existing_questions)} existing questions")
+    logger.debug("[Flashcards] Selected %d chunks from %d total (%s MODE)", len(selected_chunks), len(all_chunks), mode_label)
+    logger.debug("[Flashcards] Avoiding %d existing questions", len(existing_questions))
     
     flashcard_prompt_template = """Based on the following document content, generate {count} flashcards.
 Each flashcard should have a "front" (question, max 50 characters) and "back" (answer, max 25 words).
@@ -329,11 +333,11 @@ Generate the flashcards."""
     
     import time
     start_time = time.time()
-    print(f"[Flashcards] Starting generation of {target_count} cards...")
+    logger.debug("[Flashcards] Starting generation of %d cards", target_count)
     
     # Batching for local mode to handle large documents
     if is_local and len(selected_chunks) >= 5:
-        print(f"[Flashcards] Using batching with {len(selected_chunks)} chunks")
+        logger.debug("[Flashcards] Using batching with %d chunks", len(selected_chunks))
         batch_size = 5  # Process 5 chunks per batch for better local GPU handling
         batches = [selected_chunks[i:i+batch_size] for i in range(0, len(selected_chunks), batch_size)]
         cards_per_batch = max(3, target_count // len(batches))
@@ -346,7 +350,7 @@ Generate the flashcards."""
                 count=cards_per_batch,
                 existing_instruction=existing_instruction
             )
-            print(f"[Flashcards] Processing batch {i+1}/{len(batches)}")
+            logger.debug("[Flashcards] Processing batch %d/%d", i + 1, len(batches))
             batch_response = await llm_client.generate_simple_response(batch_prompt)
             batch_cards = _parse_flashcards_response(batch_response)
             all_flashcards.extend(batch_cards)
@@ -365,7 +369,7 @@ Generate the flashcards."""
         flashcards = _deduplicate_flashcards(flashcards, target_count)
     
     elapsed = time.time() - start_time
-    print(f"[Flashcards] Completed {len(flashcards)} cards in {elapsed:.2f}s")
+    logger.debug("[Flashcards] Completed %d cards in %.2fs", len(flashcards), elapsed)
     
     return flashcards
 
@@ -373,8 +377,8 @@ Generate the flashcards."""
 def _parse_mindmap_response(response_text: str) -> Dict:
     """Parse LLM response to extract mindmap data."""
     cleaned = response_text.strip()
-    cleaned = re.sub(r'```(?:json)?\s*', '', cleaned)
-    cleaned = re.sub(r'\s*```', '', cleaned)
+    cleaned = _FENCE_OPEN_RE.sub('', cleaned)
+    cleaned = _FENCE_CLOSE_RE.sub('', cleaned)
     
     first_brace = cleaned.find('{')
     if first_brace > 0:
@@ -390,11 +394,51 @@ def _parse_mindmap_response(response_text: str) -> Dict:
     return {"title": "Document Overview", "nodes": []}
 
 
+# Characters that can open, close or quote a JSON array; everything else is skipped
+_ARRAY_TOKEN_RE = re.compile(r'[\[\]"\\]')
+
+
+def _balanced_json_arrays(text: str):
+    """Yield each top-level [...] region of text in one linear pass.
+
+    Brackets inside JSON strings are ignored. Quotes only count inside an array, so
+    stray quotes in surrounding prose don't throw off the depth.
+    """
+    depth = 0
+    start = 0
+    in_string = False
+    skip_at = -1
+    for match in _ARRAY_TOKEN_RE.finditer(text):
+        i = match.start()
+        if i == skip_at:
+            continue
+        ch = match.group()
+        if in_string:
+            if ch == '\\':
+                skip_at = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = depth > 0
+        elif ch == '[':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == ']' and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i + 1]
+
+
+def _flashcards_from(data) -> List[Dict]:
+    return [card for card in data if isinstance(card, dict) and "front" in card and "back" in card]
+
+
 def _parse_flashcards_response(response_text: str) -> List[Dict]:
     """Parse LLM response to extract flashcard data."""
     cleaned = response_text.strip()
-    cleaned = re.sub(r'```(?:json)?\s*', '', cleaned)
-    cleaned = re.sub(r'\s*```', '', cleaned)
+    cleaned = _FENCE_OPEN_RE.sub('', cleaned)
+    cleaned = _FENCE_CLOSE_RE.sub('', cleaned)
     
     first_bracket = cleaned.find('[')
     if first_bracket > 0:
@@ -403,10 +447,22 @@ def _parse_flashcards_response(response_text: str) -> List[Dict]:
     try:
         data = json.loads(cleaned)
         if isinstance(data, list):
-            return [card for card in data if "front" in card and "back" in card]
-    except json.JSONDecodeError:
+            return _flashcards_from(data)
+    except (json.JSONDecodeError, RecursionError):
         pass
     
+    # Text around the array (a closing remark, a second list): parse each balanced
+    # region instead of giving up on the whole response
+    for region in _balanced_json_arrays(cleaned):
+        try:
+            data = json.loads(region)
+        except (json.JSONDecodeError, RecursionError):
+            continue
+        if isinstance(data, list):
+            cards = _flashcards_from(data)
+            if cards:
+                return cards
+    
     return []
 
 
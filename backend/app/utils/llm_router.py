@@ -1,18 +1,41 @@
+import re
+from functools import lru_cache
 from typing import Optional
 
 from ..config import DEFAULT_LLM_MODE
 
+# Summary intent keywords in one case-insensitive scan. Each must start a word, so
+# "logistics" or "debrief" don't count, while "summarizing" or "briefly" still do
+SUMMARY_REQUEST_RE = re.compile(
+    r'\b(?:summari[sz]|summary|sumary|brief|overview|gist|main points|key points|highlights)',
+    re.IGNORECASE,
+)
 
-def get_llm_client(llm_mode: Optional[str] = None, cloud_model: Optional[str] = None):
-    mode = (llm_mode or DEFAULT_LLM_MODE or "api").lower()
+
+def is_summary_request(query: str) -> bool:
+    return SUMMARY_REQUEST_RE.search(query) is not None
+
+
+@lru_cache(maxsize=None)
+def _shared_client(mode: str, cloud_model: Optional[str]):
+    """Build one client per provider; they keep no per-request state and hold pooled connections."""
     if mode == "local":
         from .ollama_client import OllamaClient
         return OllamaClient()
 
-    selected_cloud = (cloud_model or "gemini").lower()
-    if selected_cloud == "groq":
+    if cloud_model == "groq":
         from .groq_client import GroqClient
         return GroqClient()
 
     from .gemini_client import GeminiClient
     return GeminiClient()
+
+
+def get_llm_client(llm_mode: Optional[str] = None, cloud_model: Optional[str] = None):
+    mode = (llm_mode or DEFAULT_LLM_MODE or "api").lower()
+    if mode == "local":
+        return _shared_client("local", None)
+
+    # Anything other than groq falls back to gemini; normalizing keeps the cache to three entries
+    selected_cloud = (cloud_model or "gemini").lower()
+    return _shared_client("api", "groq" if selected_cloud == "groq" else "gemini")
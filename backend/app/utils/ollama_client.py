@@ -2,6 +2,7 @@ import asyncio
 import logging
 import os
 import queue
+import re
 import threading
 import weakref
 from contextlib import asynccontextmanager
@@ -13,6 +14,26 @@ from ollama import Client
 
 from ..config import OLLAMA_MODEL, OLLAMA_HOST, OLLAMA_CONTEXT_LENGTH, OLLAMA_MAX_PARALLEL
 
+# Everything from the first echoed prompt label ("QUESTION:", "REMINDER:", "DOCUMENTS:",
+# "PREVIOUS CHAT:"), hallucinated "Question:/Answer:" line, or "Please note"/"Note:"/
+# "Important:" disclaimer to the end of the response; one scan instead of one per pattern
+TRAILING_ARTIFACT_RE = re.compile(
+    r'\n*\b(?:QUESTION|REMINDER|DOCUMENTS|PREVIOUS CHAT|Note|Important)\s*:.*'
+    r'|\n*\bPlease note\b.*'
+    r'|\n+(?:Q(?:uestion)?|A(?:nswer)?)\s*:\s*.+',
+    re.DOTALL | re.IGNORECASE,
+)
+
+# Chat-template leftovers stripped from replies, applied in this order
+_ROLE_LABEL_LINE_RE = re.compile(r'^(USER|Assistant):\s*', re.MULTILINE)
+_ROLE_LABEL_AFTER_NEWLINE_RE = re.compile(r'\n(USER|Assistant):\s*')
+_SYSTEM_BLOCK_RE = re.compile(r'<\|system\|>.*?<\|end\|>', re.DOTALL)
+_USER_BLOCK_RE = re.compile(r'<\|user\|>.*?<\|end\|>', re.DOTALL)
+_ROLE_LABEL_RE = re.compile(r'(USER|Assistant):\s*')
+_ASSISTANT_TAG_RE = re.compile(r'<\|assistant\|>')
+_END_TAG_RE = re.compile(r'<\|end\|>')
+_TEMPLATE_MARKER_TOKENS = frozenset(['USER:', 'Assistant:', '<|assistant|>', '<|end|>', '<|user|>', '<|system|>'])
+
 logger = logging.getLogger(__name__)
 
 # ============== LLM Server Configuration ==============
@@ -456,32 +477,18 @@ CRITICAL - STOP AFTER ANSWERING:
         if not text:
             return text
         
-        import re
-        
         # Remove USER: and Assistant: labels that appear in responses
-        text = re.sub(r'^(USER|Assistant):\s*', '', text, flags=re.MULTILINE)
-        text = re.sub(r'\n(USER|Assistant):\s*', '\n', text)
+        text = _ROLE_LABEL_LINE_RE.sub('', text)
+        text = _ROLE_LABEL_AFTER_NEWLINE_RE.sub('\n', text)
         
         # Remove chat template tags if present
-        text = re.sub(r'<\|system\|>.*?<\|end\|>', '', text, flags=re.DOTALL)
-        text = re.sub(r'<\|user\|>.*?<\|end\|>', '', text, flags=re.DOTALL)
-        text = re.sub(r'<\|assistant\|>', '', text)
-        text = re.sub(r'<\|end\|>', '', text)
-        
-        # Strip trailing echoed prompt artifacts: "QUESTION: ...", "REMINDER: ...", "DOCUMENTS: ..."
-        # These appear when the local LLM echoes back parts of the prompt at the end
-        text = re.sub(r'\n*\bQUESTION\s*:.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'\n*\bREMINDER\s*:.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'\n*\bDOCUMENTS\s*:.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'\n*\bPREVIOUS CHAT\s*:.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
+        text = _SYSTEM_BLOCK_RE.sub('', text)
+        text = _USER_BLOCK_RE.sub('', text)
+        text = _ASSISTANT_TAG_RE.sub('', text)
+        text = _END_TAG_RE.sub('', text)
         
-        # Strip trailing "Question: ..." / "Answer: ..." patterns added by hallucination
-        text = re.sub(r'\n+(?:Q(?:uestion)?|A(?:nswer)?)\s*:\s*.+$', '', text, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Strip "Please note..." disclaimer paragraphs
-        text = re.sub(r'\n*\bPlease note\b.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'\n*\bNote\s*:.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'\n*\bImportant\s*:.*$', '', text, flags=re.DOTALL | re.IGNORECASE)
+        # Strip trailing echoed prompt artifacts and hallucinated Q/A or disclaimer tails
+        text = TRAILING_ARTIFACT_RE.sub('', text)
         
         # Remove empty lines at start and end
         return text.strip()
@@ -491,16 +498,17 @@ CRITICAL - STOP AFTER ANSWERING:
         if not token:
             return token
         
-        import re
-        
         # Skip tokens that are just template markers
-        if token.strip() in ['USER:', 'Assistant:', '<|assistant|>', '<|end|>', '<|user|>', '<|system|>']:
+        if token.strip() in _TEMPLATE_MARKER_TOKENS:
             return ''
         
-        # Remove these patterns if they appear
-        token = re.sub(r'(USER|Assistant):\s*', '', token)
-        token = re.sub(r'<\|assistant\|>', '', token)
-        token = re.sub(r'<\|end\|>', '', token)
+        # Remove these patterns if they appear; most tokens hold neither marker, so
+        # a substring check skips the regex passes for them
+        if ':' in token:
+            token = _ROLE_LABEL_RE.sub('', token)
+        if '<|' in token:
+            token = _ASSISTANT_TAG_RE.sub('', token)
+            token = _END_TAG_RE.sub('', token)
         
         return token
 
@@ -0,0 +1,101 @@
+"""
+Semantic answer cache for near-duplicate chat questions.
+
+Query embeddings are hashed with random hyperplane projections (LSH) into a few
+tables, so a lookup only compares cosine similarity against entries sharing a
+bucket with the query instead of scanning every stored question.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Set
+
+import numpy as np
+
+from ..config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES
+
+_LSH_TABLES = 4  # Independent hash tables; a hit in any of them makes an entry a candidate
+_LSH_BITS = 8  # Hyperplanes per table (256 buckets each)
+_LSH_SEED = 20240611  # Fixed so bucket layout is stable for the life of the process
+
+
+class SemanticAnswerCache:
+    """LRU cache of LLM results keyed by query embedding, with TTL (thread-safe)."""
+    
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._planes: Optional[np.ndarray] = None  # Built on first use, once the dimension is known
+        self._bit_weights = 1 << np.arange(_LSH_BITS)
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(_LSH_TABLES)]
+        # entry id -> (expires_at, scope, unit vector, bucket keys, result)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def _unit_and_keys(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        unit = vector / norm if norm > 0 else vector
+        if self._planes is None:
+            rng = np.random.default_rng(_LSH_SEED)
+            self._planes = rng.standard_normal((_LSH_TABLES, _LSH_BITS, unit.shape[0])).astype(np.float32)
+        bits = (self._planes @ unit) > 0
+        keys = (bits * self._bit_weights).sum(axis=1)
+        return unit, [int(key) for key in keys]
+    
+    def _remove(self, entry_id: int) -> None:
+        _, _, _, keys, _ = self._entries.pop(entry_id)
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[key]
+    
+    def get(self, embedding, scope: Hashable) -> Optional[Dict]:
+        """Return the stored result for the most similar live entry under ``scope``, if close enough."""
+        with self._lock:
+            if not self._entries:
+                return None
+            unit, keys = self._unit_and_keys(embedding)
+            candidates = set()
+            for table, key in zip(self._tables, keys):
+                candidates.update(table.get(key, ()))
+            
+            now = time.monotonic()
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                expires_at, entry_scope, entry_unit, _, _ = self._entries[entry_id]
+                if expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                if entry_scope != scope:
+                    continue
+                score = float(np.dot(unit, entry_unit))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            
+            if best_id is None:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][4]
+    
+    def put(self, embedding, scope: Hashable, result: Dict) -> None:
+        """Store a result for a query embedding, evicting the least recently used entries."""
+        with self._lock:
+            unit, keys = self._unit_and_keys(embedding)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (time.monotonic() + self.ttl, scope, unit, keys, result)
+            for table, key in zip(self._tables, keys):
+                table.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
@@ -10,7 +10,7 @@ import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
 import { oneLight } from 'react-syntax-highlighter/dist/esm/styles/prism';
-import { getConversation, sendMessage, sendMessageStream, uploadFiles, addDocumentsToConversation, editMessage, deleteMessage as deleteMessageApi, deleteDocument, createNote, updateNote, convertNoteToSource, unconvertNoteFromSource, toggleDocument, getFlashcards, generateFlashcards, deleteFlashcard, getMindMap, generateMindMap, downloadChat } from '../utils/api';
+import { getConversation, sendMessage, sendMessageStream, uploadFiles, addDocumentsToConversation, editMessage, deleteMessage as deleteMessageApi, deleteDocument, getDocumentContent, createNote, updateNote, convertNoteToSource, unconvertNoteFromSource, toggleDocument, getFlashcards, generateFlashcards, deleteFlashcard, getMindMap, generateMindMap, downloadChat } from '../utils/api';
 import MindMapCanvas from './MindMapCanvas';
 import { Button } from './ui/button';
 
@@ -1478,6 +1478,21 @@ const ChatInterface = ({ conversationId, onConversationUpdate }) => {
     }
   };
 
+  // File contents are not part of the conversation payload; fetch one when its preview opens
+  const openSourcePreview = async (doc, highlight = null) => {
+    setSourcePreview(doc);
+    setSourceHighlight(highlight);
+    if (doc.content !== undefined && doc.content !== null) return;
+    if (typeof doc.id !== 'number') return;
+    try {
+      const { content } = await getDocumentContent(conversationId, doc.id);
+      setDocuments(prev => prev.map(d => d.id === doc.id ? { ...d, content } : d));
+      setSourcePreview(prev => (prev && prev.id === doc.id ? { ...prev, content } : prev));
+    } catch (error) {
+      console.error('Failed to load document content:', error);
+    }
+  };
+
   // Toggle document active status
   const handleToggleDocument = async (docId, currentStatus) => {
     try {
@@ -2273,7 +2288,7 @@ const ChatInterface = ({ conversationId, onConversationUpdate }) => {
                             ? `ring-2 ring-primary bg-primary/5 border-primary/30`
                             : `${theme.cardBg} ${theme.cardBorder} hover:border-primary/30 hover:shadow-md`}
                           ${doc.is_active === false ? 'opacity-60' : ''}`}
-                        onClick={() => { setSourcePreview(doc); setSourceHighlight(null); }}
+                        onClick={() => openSourcePreview(doc)}
                       >
                         {/* Checkbox for active/inactive */}
                         <button
@@ -2707,8 +2722,7 @@ const ChatInterface = ({ conversationId, onConversationUpdate }) => {
                                   const doc = documents.find(d => d.filename === source || d.filename?.includes(source.split('_page_')[0]));
                                   if (doc) {
                                     setLeftPanelCollapsed(false);
-                                    setSourcePreview(doc);
-                                    setSourceHighlight(chunkContent || source);
+                                    openSourcePreview(doc, chunkContent || source);
                                   }
                                 }}
                               />
@@ -266,6 +266,11 @@ export const verifyToken = async () => {
   return response.data
 }
 
+export const getDocumentContent = async (conversationId, documentId) => {
+  const response = await api.get(`/api/conversations/${conversationId}/documents/${documentId}/content`)
+  return response.data
+}
+
 export const deleteDocument = async (conversationId, documentId) => {
   await api.delete(`/api/conversations/${conversationId}/documents/${documentId}`)
 }